@@ -1,9 +1,11 @@
 import asyncio
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import pool
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
+from sqlalchemy.schema import SchemaItem
 
 from alembic import context
 from app.core.config import config as app_config
@@ -26,6 +28,23 @@ from app.schema import Base  # noqa: E402
 
 target_metadata = Base.metadata
 
+
+def include_object(
+    _object: SchemaItem,
+    name: str | None,
+    type_: str,
+    _reflected: bool,
+    compare_to: SchemaItem | None,
+) -> bool:
+    # Partitions of the tables partitioned by owner are created by migrations,
+    # not declared as models
+    return not (
+        type_ == "table"
+        and compare_to is None
+        and re.fullmatch(r"(tasks|task_labels)_p\d+", name or "")
+    )
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -48,6 +67,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -57,7 +77,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
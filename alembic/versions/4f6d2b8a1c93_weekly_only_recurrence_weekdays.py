@@ -0,0 +1,37 @@
+"""weekly only recurrence weekdays
+
+Revision ID: 4f6d2b8a1c93
+Revises: c81f5e2a7d46
+Create Date: 2026-10-19 21:04:37.218546
+
+Weekdays are only valid on weekly rules, so the ones saved on daily and
+monthly rules, which were ignored until shifting their occurrences, are
+dropped.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f6d2b8a1c93'
+down_revision: Union[str, Sequence[str], None] = 'c81f5e2a7d46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table in ('tasks', 'archived_tasks'):
+        op.execute(
+            f"UPDATE {table} SET recurrence = recurrence - 'weekdays' "
+            "WHERE recurrence ? 'weekdays' "
+            "AND recurrence ->> 'frequency' <> 'weekly'"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    pass
@@ -0,0 +1,215 @@
+"""partition tasks by owner
+
+Revision ID: d4e0e839f51f
+Revises: b3e8f1a94c27
+Create Date: 2026-10-19 13:41:27.530916
+
+Rebuilds tasks and task_labels as tables hash partitioned on owner_id while
+the app keeps running:
+
+1. Partitioned copies are created, and triggers on the old tables mirror every
+   write into them.
+2. Existing rows are copied in batches, each committed on its own, so no lock
+   is held for long.
+3. In one short transaction, the old tables are dropped and the copies take
+   their names.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e0e839f51f'
+down_revision: Union[str, Sequence[str], None] = 'b3e8f1a94c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONS = 16
+BATCH_SIZE = 10_000
+
+
+def create_partitions(table: str) -> None:
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE {table.removesuffix('_partitioned')}_p{remainder} "
+            f"PARTITION OF {table} "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+        )
+
+
+def backfill(statement: str) -> None:
+    """Run `statement` over consecutive ranges of task ids, in autocommit."""
+    connection = op.get_bind()
+    max_id = connection.scalar(sa.text("SELECT coalesce(max(id), 0) FROM tasks"))
+    for start in range(0, max_id, BATCH_SIZE):
+        connection.execute(
+            sa.text(statement), {"start": start, "end": start + BATCH_SIZE}
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        "CREATE TABLE tasks_partitioned (LIKE tasks INCLUDING DEFAULTS) "
+        "PARTITION BY HASH (owner_id)"
+    )
+    op.execute(
+        "ALTER TABLE tasks_partitioned "
+        "ADD CONSTRAINT tasks_partitioned_pkey PRIMARY KEY (id, owner_id), "
+        "ADD CONSTRAINT tasks_owner_id_fkey FOREIGN KEY (owner_id) "
+        "REFERENCES users (id) ON DELETE CASCADE, "
+        "ADD CONSTRAINT tasks_project_id_fkey FOREIGN KEY (project_id) "
+        "REFERENCES projects (id) ON DELETE CASCADE"
+    )
+    op.execute("CREATE INDEX ix_tasks_partitioned_due_date ON tasks_partitioned (due_date)")
+    op.execute("CREATE INDEX ix_tasks_partitioned_title ON tasks_partitioned (title)")
+    op.execute("CREATE INDEX ix_tasks_partitioned_project_id ON tasks_partitioned (project_id)")
+    create_partitions('tasks_partitioned')
+
+    op.execute(
+        "CREATE TABLE task_labels_partitioned ("
+        "task_id INTEGER NOT NULL, "
+        "label_id INTEGER NOT NULL, "
+        "owner_id INTEGER NOT NULL, "
+        "CONSTRAINT task_labels_partitioned_pkey "
+        "PRIMARY KEY (task_id, label_id, owner_id), "
+        "CONSTRAINT task_labels_label_id_fkey FOREIGN KEY (label_id) "
+        "REFERENCES labels (id) ON DELETE CASCADE"
+        ") PARTITION BY HASH (owner_id)"
+    )
+    create_partitions('task_labels_partitioned')
+
+    op.execute("""
+        CREATE FUNCTION mirror_tasks() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM tasks_partitioned
+                WHERE id = OLD.id AND owner_id = OLD.owner_id;
+                RETURN OLD;
+            END IF;
+            INSERT INTO tasks_partitioned SELECT NEW.*
+            ON CONFLICT (id, owner_id) DO UPDATE SET
+                title = EXCLUDED.title,
+                description = EXCLUDED.description,
+                priority = EXCLUDED.priority,
+                completed = EXCLUDED.completed,
+                due_date = EXCLUDED.due_date,
+                created_at = EXCLUDED.created_at,
+                project_id = EXCLUDED.project_id,
+                recurrence = EXCLUDED.recurrence;
+            RETURN NEW;
+        END $$
+    """)
+    op.execute(
+        "CREATE TRIGGER mirror_tasks AFTER INSERT OR UPDATE OR DELETE ON tasks "
+        "FOR EACH ROW EXECUTE FUNCTION mirror_tasks()"
+    )
+    op.execute("""
+        CREATE FUNCTION mirror_task_labels() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM task_labels_partitioned
+                WHERE task_id = OLD.task_id AND label_id = OLD.label_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO task_labels_partitioned (task_id, label_id, owner_id)
+                SELECT NEW.task_id, NEW.label_id, owner_id
+                FROM tasks WHERE id = NEW.task_id
+                ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END $$
+    """)
+    op.execute(
+        "CREATE TRIGGER mirror_task_labels "
+        "AFTER INSERT OR UPDATE OR DELETE ON task_labels "
+        "FOR EACH ROW EXECUTE FUNCTION mirror_task_labels()"
+    )
+
+    op.add_column('task_occurrences', sa.Column('owner_id', sa.Integer(), nullable=True))
+
+    # Copy the existing rows in batches. Locking the source rows keeps a
+    # concurrent delete from committing before its row is copied, which would
+    # leave the copy behind.
+    with op.get_context().autocommit_block():
+        backfill(
+            "INSERT INTO tasks_partitioned "
+            "SELECT * FROM tasks WHERE id > :start AND id <= :end "
+            "FOR KEY SHARE "
+            "ON CONFLICT DO NOTHING"
+        )
+        # Every task has a copy from here on, so the labels can reference them
+        op.execute(
+            "ALTER TABLE task_labels_partitioned "
+            "ADD CONSTRAINT task_labels_task_id_owner_id_fkey "
+            "FOREIGN KEY (task_id, owner_id) "
+            "REFERENCES tasks_partitioned (id, owner_id) ON DELETE CASCADE"
+        )
+        backfill(
+            "INSERT INTO task_labels_partitioned (task_id, label_id, owner_id) "
+            "SELECT task_labels.task_id, task_labels.label_id, tasks.owner_id "
+            "FROM task_labels JOIN tasks ON tasks.id = task_labels.task_id "
+            "WHERE task_labels.task_id > :start AND task_labels.task_id <= :end "
+            "FOR KEY SHARE OF task_labels "
+            "ON CONFLICT DO NOTHING"
+        )
+
+    op.execute("LOCK TABLE tasks, task_labels, task_occurrences IN ACCESS EXCLUSIVE MODE")
+    op.execute(
+        "UPDATE task_occurrences SET owner_id = tasks.owner_id FROM tasks "
+        "WHERE tasks.id = task_occurrences.task_id"
+    )
+    op.drop_constraint('task_occurrences_task_id_fkey', 'task_occurrences', type_='foreignkey')
+    op.alter_column('task_occurrences', 'owner_id', existing_type=sa.Integer(), nullable=False)
+
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY tasks_partitioned.id")
+    op.drop_table('task_labels')
+    op.drop_table('tasks')
+    op.execute("DROP FUNCTION mirror_task_labels()")
+    op.execute("DROP FUNCTION mirror_tasks()")
+
+    op.rename_table('tasks_partitioned', 'tasks')
+    op.execute("ALTER INDEX tasks_partitioned_pkey RENAME TO tasks_pkey")
+    op.execute("ALTER INDEX ix_tasks_partitioned_due_date RENAME TO ix_tasks_due_date")
+    op.execute("ALTER INDEX ix_tasks_partitioned_title RENAME TO ix_tasks_title")
+    op.execute("ALTER INDEX ix_tasks_partitioned_project_id RENAME TO ix_tasks_project_id")
+    op.rename_table('task_labels_partitioned', 'task_labels')
+    op.execute("ALTER INDEX task_labels_partitioned_pkey RENAME TO task_labels_pkey")
+
+    op.create_foreign_key(None, 'task_occurrences', 'tasks', ['task_id', 'owner_id'], ['id', 'owner_id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("LOCK TABLE tasks, task_labels, task_occurrences IN ACCESS EXCLUSIVE MODE")
+    op.drop_constraint('task_occurrences_task_id_owner_id_fkey', 'task_occurrences', type_='foreignkey')
+    op.drop_column('task_occurrences', 'owner_id')
+
+    op.execute("CREATE TABLE tasks_unpartitioned (LIKE tasks INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO tasks_unpartitioned SELECT * FROM tasks")
+    op.execute(
+        "CREATE TABLE task_labels_unpartitioned AS "
+        "SELECT task_id, label_id FROM task_labels"
+    )
+    op.execute("ALTER SEQUENCE tasks_id_seq OWNED BY tasks_unpartitioned.id")
+    op.drop_table('task_labels')
+    op.drop_table('tasks')
+
+    op.rename_table('tasks_unpartitioned', 'tasks')
+    op.create_primary_key('tasks_pkey', 'tasks', ['id'])
+    op.create_foreign_key('tasks_owner_id_fkey', 'tasks', 'users', ['owner_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('tasks_project_id_fkey', 'tasks', 'projects', ['project_id'], ['id'], ondelete='CASCADE')
+    op.create_index(op.f('ix_tasks_due_date'), 'tasks', ['due_date'], unique=False)
+    op.create_index(op.f('ix_tasks_title'), 'tasks', ['title'], unique=False)
+
+    op.rename_table('task_labels_unpartitioned', 'task_labels')
+    op.alter_column('task_labels', 'task_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('task_labels', 'label_id', existing_type=sa.Integer(), nullable=False)
+    op.create_primary_key('task_labels_pkey', 'task_labels', ['task_id', 'label_id'])
+    op.create_foreign_key('task_labels_label_id_fkey', 'task_labels', 'labels', ['label_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('task_labels_task_id_fkey', 'task_labels', 'tasks', ['task_id'], ['id'], ondelete='CASCADE')
+
+    op.create_foreign_key('task_occurrences_task_id_fkey', 'task_occurrences', 'tasks', ['task_id'], ['id'], ondelete='CASCADE')
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import delete, exists, insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import config
+from app.core.db import async_session, pool_ready
+from app.schema import ArchivedTask, ArchivedTaskLabel, Task, TaskLabel
+
+logger = logging.getLogger(__name__)
+
+# Columns shared by tasks and archived_tasks, copied as they are
+TASK_COLUMNS = [column.name for column in Task.__table__.columns]
+TASK_LABEL_COLUMNS = ["task_id", "label_id", "owner_id"]
+
+
+async def archive_tasks(batch_size: int) -> int:
+    """Move up to `batch_size` tasks completed more than
+    `archive_completed_after_days` ago, with their labels, to the archive.
+
+    Returns the number of tasks moved. Recurring tasks are left in place, as
+    their completed occurrences are not archived, and so are tasks with a
+    parent or subtasks, so subtrees stay whole.
+    """
+    completed_before = datetime.now(tz=UTC) - timedelta(
+        days=config.archive_completed_after_days
+    )
+
+    subtask = aliased(Task)
+
+    async with async_session() as session:
+        # Rows locked by a request or another worker are left for the next run
+        result = await session.execute(
+            select(Task.id, Task.owner_id)
+            .where(Task.completed)
+            .where(Task.completed_at < completed_before)
+            .where(Task.recurrence.is_(None))
+            .where(Task.parent_id.is_(None))
+            .where(
+                ~exists()
+                .where(subtask.parent_id == Task.id)
+                .where(subtask.owner_id == Task.owner_id)
+            )
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        keys = [tuple(key) for key in result]
+        if not keys:
+            return 0
+
+        await session.execute(
+            insert(ArchivedTask).from_select(
+                TASK_COLUMNS,
+                select(*(Task.__table__.c[name] for name in TASK_COLUMNS)).where(
+                    tuple_(Task.id, Task.owner_id).in_(keys)
+                ),
+            )
+        )
+        await session.execute(
+            insert(ArchivedTaskLabel).from_select(
+                TASK_LABEL_COLUMNS,
+                select(TaskLabel.task_id, TaskLabel.label_id, TaskLabel.owner_id).where(
+                    tuple_(TaskLabel.task_id, TaskLabel.owner_id).in_(keys)
+                ),
+            )
+        )
+        # Cascades to the task_labels links
+        await session.execute(
+            delete(Task).where(tuple_(Task.id, Task.owner_id).in_(keys))
+        )
+
+        await session.commit()
+
+    return len(keys)
+
+
+async def unarchive_task(session: AsyncSession, task_id: int, owner_id: int) -> bool:
+    """Move an archived task, with its labels, back to `tasks` in the
+    session's transaction. Returns whether the task was archived."""
+    restored_id = await session.scalar(
+        insert(Task)
+        .from_select(
+            TASK_COLUMNS,
+            select(*(ArchivedTask.__table__.c[name] for name in TASK_COLUMNS))
+            .where(ArchivedTask.id == task_id)
+            .where(ArchivedTask.owner_id == owner_id)
+            .where(ArchivedTask.deleted_at.is_(None))
+            .with_for_update(),
+        )
+        .returning(Task.id)
+    )
+    if restored_id is None:
+        return False
+
+    await session.execute(
+        insert(TaskLabel).from_select(
+            TASK_LABEL_COLUMNS,
+            select(
+                ArchivedTaskLabel.task_id,
+                ArchivedTaskLabel.label_id,
+                ArchivedTaskLabel.owner_id,
+            )
+            .where(ArchivedTaskLabel.task_id == task_id)
+            .where(ArchivedTaskLabel.owner_id == owner_id),
+        )
+    )
+    # Cascades to the archived_task_labels links
+    await session.execute(
+        delete(ArchivedTask)
+        .where(ArchivedTask.id == task_id)
+        .where(ArchivedTask.owner_id == owner_id)
+    )
+
+    return True
+
+
+async def run_archiver() -> None:
+    """Archive completed tasks every `archive_interval_seconds`, batch by batch
+    until none are left, so the hot table stays sized to active work.
+
+    Each worker runs one, and they skip each other's locked rows.
+    """
+    await pool_ready.wait()
+    while True:
+        try:
+            archived = 0
+            while (batch := await archive_tasks(config.archive_batch_size)) > 0:
+                archived += batch
+                if batch < config.archive_batch_size:
+                    break
+            if archived:
+                logger.info("Archived %d completed tasks", archived)
+        except Exception:
+            logger.exception("Could not archive completed tasks")
+
+        await asyncio.sleep(config.archive_interval_seconds)
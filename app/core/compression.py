@@ -0,0 +1,116 @@
+import gzip
+from collections.abc import Callable
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import config
+
+type Compressor = Callable[[bytes], bytes]
+
+
+def compress_gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=config.gzip_level, mtime=0)
+
+
+# By preference, for the clients accepting several equally. Brotli needs the
+# brotli package, and zstd a Python built with it.
+compressors: dict[str, Compressor] = {}
+try:
+    from compression import zstd
+
+    compressors["zstd"] = lambda body: zstd.compress(body, level=config.zstd_level)
+except ImportError:
+    pass
+try:
+    # Not a dependency, brotli is only offered where it is installed
+    import brotli  # pyrefly: ignore[missing-import]
+
+    compressors["br"] = lambda body: brotli.compress(
+        body, quality=config.brotli_quality
+    )
+except ImportError:
+    pass
+compressors["gzip"] = compress_gzip
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Return the supported encoding the client prefers from its
+    Accept-Encoding header, if any."""
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        weight = 1.0
+        name, _, value = params.partition("=")
+        if name.strip() == "q":
+            try:
+                weight = float(value)
+            except ValueError:
+                continue
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in compressors:
+        weight = weights.get(encoding, weights.get("*", 0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class CompressionMiddleware:
+    """Compress responses of at least `compression_minimum_size` bytes with
+    zstd, brotli or gzip, whichever the client prefers, and mark every response
+    sent whole as varying by Accept-Encoding.
+
+    Streamed responses, like the event stream, are sent as they are, as
+    compressing them would hold back every chunk.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        encoding = negotiate_encoding(accept_encoding)
+
+        start_message: Message | None = None
+
+        async def compress_send(message: Message) -> None:
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            if message.get("more_body", False) or "content-encoding" in headers:
+                await send(start_message)
+            else:
+                # Compressed or not, the response depends on Accept-Encoding,
+                # so caches must not serve it to clients accepting others
+                headers.add_vary_header("Accept-Encoding")
+                if (
+                    encoding is not None
+                    and len(body) >= config.compression_minimum_size
+                ):
+                    body = compressors[encoding](body)
+                    headers["content-encoding"] = encoding
+                    headers["content-length"] = str(len(body))
+                    message = {**message, "body": body}
+                await send(start_message)
+
+            # Sent as they come from here on
+            start_message = None
+            await send(message)
+
+        await self.app(scope, receive, compress_send)
@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
 from pydantic import (
     AnyUrl,
@@ -27,6 +27,9 @@ class Settings(BaseSettings):
     pgdatabase: str
     pguser: str
     pgpassword: str
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_warm_connections: int = 2
 
     @computed_field
     @property
@@ -39,6 +42,50 @@ class Settings(BaseSettings):
             path=self.pgdatabase,
         )
 
+    # Connections the app may open on the primary across all workers, below
+    # Postgres' max_connections to leave room for migrations and admin
+    db_max_connections: int | None = None
+
+    @computed_field
+    @property
+    def db_pool_limits(self) -> tuple[int, int]:
+        """Pool size and overflow of each worker, within its share of
+        `db_max_connections`. A connection per worker is kept for LISTEN.
+
+        Every job a worker runs holds a connection and reports its progress
+        on another, so the overflow makes room for two per job worker, taken
+        from the requests' share of the budget.
+        """
+        jobs = 2 * self.job_workers
+        if self.db_max_connections is None:
+            return self.db_pool_size, self.db_max_overflow + jobs
+
+        budget = max(1, self.db_max_connections // (self.web_concurrency or 1) - 1)
+        pool_size = max(1, min(self.db_pool_size, budget - jobs))
+        return pool_size, max(0, min(self.db_max_overflow + jobs, budget - pool_size))
+
+    # Read replica, sharing the primary's database and credentials
+    pghost_replica: str | None = None
+    replica_stickiness_seconds: float = 5
+
+    @computed_field
+    @property
+    def sqlalchemy_replica_database_uri(self) -> PostgresDsn | None:
+        if not self.pghost_replica:
+            return None
+        return PostgresDsn.build(
+            scheme="postgresql+asyncpg",
+            username=self.pguser,
+            password=self.pgpassword,
+            host=self.pghost_replica,
+            path=self.pgdatabase,
+        )
+
+    # Serving, workers are sized from the machine's CPUs and memory when
+    # WEB_CONCURRENCY is unset
+    web_concurrency: int | None = None
+    worker_memory_mb: int = 160
+
     # CORS
     cors_origins: Annotated[list[AnyUrl] | str, BeforeValidator(parse_cors)] = []
 
@@ -52,5 +99,68 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
 
+    # Requests
+    request_timeout_seconds: float = 30
+    # Request bodies are buffered whole, larger ones are rejected with 413
+    max_request_body_bytes: int = 1024 * 1024
+
+    # Response compression, with levels low enough that compressing a large
+    # page costs about as much CPU as encoding it
+    compression_minimum_size: int = 1024
+    gzip_level: int = 5
+    brotli_quality: int = 4
+    zstd_level: int = 3
+
+    # Recurring tasks, expanded up to this many days from now for views with
+    # an open end, like upcoming and overdue tasks
+    recurrence_horizon_days: int = 30
+
+    # Archival, moving tasks completed this many days ago out of the hot table
+    archive_completed_after_days: int = 30
+    archive_interval_seconds: float = 3600
+    archive_batch_size: int = 1000
+
+    # Purging of soft deleted projects and tasks, in small batches spaced out
+    # so a large deletion never holds locks for long
+    purge_interval_seconds: float = 60
+    purge_batch_size: int = 500
+    purge_batch_delay_seconds: float = 0.1
+
+    # Background jobs, run by this many tasks in each web worker, set to 0 to
+    # run them beside the web workers with `python -m scripts.worker` instead
+    job_workers: int = 2
+    job_poll_interval_seconds: float = 1
+    # A running job is claimed again once its lease expires without progress
+    job_lease_seconds: float = 60
+    job_max_attempts: int = 5
+    # Retries back off exponentially from the first delay up to the last
+    job_retry_delay_seconds: float = 5
+    job_max_retry_delay_seconds: float = 600
+
+    # Manual task order, with a project's ranks respaced in the background once
+    # one grows this long from repeated moves to the same spot
+    rank_max_length: int = 32
+
+    # Health checks
+    health_check_interval_seconds: float = 5
+    max_event_loop_lag_seconds: float = 0.5
+
+    # Rate limiting
+    rate_limit_backend: Literal["memory", "postgres"] = "memory"
+    rate_limit_per_minute: int = 120
+    auth_rate_limit_per_minute: int = 10
+    max_concurrent_requests_per_user: int = 8
+    # Header the edge proxy sets to the client's IP, like Fly-Client-IP on fly,
+    # which auth requests are limited by instead of the peer address. Only set
+    # it when every request comes through a proxy that overwrites it.
+    client_ip_header: str | None = None
+
+    # Idempotency
+    idempotency_key_ttl_hours: int = 24
+    # A key claimed by a request that never stored its response, like when its
+    # worker crashed, is freed after this long. Above the request timeout, so
+    # requests still running keep their key.
+    idempotency_claim_lease_seconds: float = 60
+
 
 config = Settings()
@@ -1,20 +1,141 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import Connection, DateTime, event, text
 from sqlalchemy.ext.asyncio import (
     AsyncAttrs,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    ORMExecuteState,
+    Session,
+    SessionTransaction,
+    mapped_column,
+    with_loader_criteria,
+)
 
 from app.core.config import config
 
+logger = logging.getLogger(__name__)
+
+pool_size, max_overflow = config.db_pool_limits
+
 engine = create_async_engine(
-    str(config.sqlalchemy_database_uri), echo=True, connect_args={"ssl": True}
+    str(config.sqlalchemy_database_uri),
+    echo=True,
+    pool_size=pool_size,
+    max_overflow=max_overflow,
+    connect_args={"ssl": True},
 )
 async_session = async_sessionmaker(
     bind=engine, class_=AsyncSession, expire_on_commit=False
 )
 
+replica_engine = (
+    create_async_engine(
+        str(config.sqlalchemy_replica_database_uri),
+        echo=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        connect_args={"ssl": True},
+    )
+    if config.sqlalchemy_replica_database_uri
+    else None
+)
+async_replica_session = (
+    async_sessionmaker(bind=replica_engine, class_=AsyncSession, expire_on_commit=False)
+    if replica_engine
+    else None
+)
+
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
+
+
+class SoftDeleteMixin:
+    """Rows are marked deleted instead of being deleted in the request, and
+    hard deleted later in small batches by the purger."""
+
+    deleted_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), default=None
+    )
+
+
+@event.listens_for(Session, "do_orm_execute")
+def hide_soft_deleted(execute_state: ORMExecuteState) -> None:
+    """Leave soft deleted rows out of every ORM statement, including the
+    relationships it loads, unless it sets the `include_deleted` option."""
+    if (
+        execute_state.is_column_load
+        or execute_state.is_relationship_load
+        or execute_state.execution_options.get("include_deleted", False)
+    ):
+        return
+
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(
+            SoftDeleteMixin,
+            lambda cls: cls.deleted_at.is_(None),
+            include_aliases=True,
+        )
+    )
+
+
+def set_statement_timeout(session: AsyncSession, deadline: float) -> None:
+    """Apply the time left until `deadline`, in event loop time, as the
+    statement_timeout of every transaction the session begins."""
+    loop = asyncio.get_running_loop()
+
+    @event.listens_for(session.sync_session, "after_begin")
+    def apply_statement_timeout(
+        _session: Session, _transaction: SessionTransaction, connection: Connection
+    ) -> None:
+        timeout_ms = max(1, int((deadline - loop.time()) * 1000))
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+
+
+# Set once the warm connections of the primary's pool are open
+pool_ready = asyncio.Event()
+
+
+async def warm_up_pool(connections: int) -> None:
+    """Open `connections` pooled connections ahead of the first requests, so
+    they do not pay for the connection and TLS handshakes.
+
+    Each connection runs a prepared statement, which also loads the type
+    codecs asyncpg needs on every connection. Retries until the database is
+    reachable, as it may be starting up too.
+    """
+
+    async def warm_up_connection() -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    connections = min(connections, pool_size)
+    delay = 1
+    while True:
+        try:
+            # Checked out concurrently, so each one is a new connection
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(connections):
+                    tg.create_task(warm_up_connection())
+        except Exception:
+            logger.warning("Could not warm up the connection pool", exc_info=True)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+        else:
+            pool_ready.set()
+            return
+
+
+async def dispose_engines() -> None:
+    """Close every pooled connection, once no request is using them."""
+    await engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
@@ -0,0 +1,165 @@
+import asyncio
+import contextlib
+import math
+
+from fastapi import Request, status
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import DBAPIError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import config
+
+REQUEST_TIMEOUT_HEADER = b"x-request-timeout"
+
+# Sent with requests shed for their deadline, as the server is likely busy
+DEADLINE_EXCEEDED_HEADERS = {"Retry-After": "1"}
+
+# SQLSTATE of a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+
+class DeadlineMiddleware:
+    """Give every request a deadline, after which its handler is cancelled.
+
+    The deadline is `request_timeout_seconds` from the start of the request,
+    shortened by an `X-Request-Timeout` header in seconds, and it can be moved
+    by a route with the `RequestTimeout` dependency. The handler is cancelled
+    too when the client disconnects, which makes asyncpg cancel the running
+    query on the server.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        client_deadline = math.inf
+        for name, value in scope["headers"]:
+            if name == REQUEST_TIMEOUT_HEADER:
+                with contextlib.suppress(ValueError):
+                    client_deadline = start + float(value)
+
+        # The request body is buffered up front, so the receive channel can be
+        # watched for a disconnect while the handler runs.
+        messages: list[Message] = []
+        body_size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body_size += len(message.get("body", b""))
+            if body_size > config.max_request_body_bytes:
+                await request_too_large()(scope, receive, send)
+                return
+            messages.append(message)
+            more_body = message.get("more_body", False)
+
+        disconnected = asyncio.Event()
+
+        async def replay_receive() -> Message:
+            if messages:
+                return messages.pop(0)
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        response_started = False
+
+        async def watch_send(message: Message) -> None:
+            nonlocal response_started
+            response_started = True
+            await send(message)
+
+        try:
+            async with asyncio.timeout_at(
+                min(start + config.request_timeout_seconds, client_deadline)
+            ) as timeout:
+                state = scope.setdefault("state", {})
+                state["timeout"] = timeout
+                state["request_start"] = start
+                state["client_deadline"] = client_deadline
+
+                # ASGI apps are typed as returning any awaitable, which a task
+                # can't be created from
+                async def run_app() -> None:
+                    await self.app(scope, replay_receive, watch_send)
+
+                app_task = asyncio.create_task(run_app())
+
+                async def watch_disconnect() -> None:
+                    while (await receive())["type"] != "http.disconnect":
+                        pass
+                    disconnected.set()
+                    app_task.cancel()
+
+                watcher = asyncio.create_task(watch_disconnect())
+                try:
+                    await app_task
+                except asyncio.CancelledError:
+                    if not disconnected.is_set():
+                        raise
+                finally:
+                    watcher.cancel()
+        except TimeoutError:
+            if not response_started:
+                await deadline_exceeded()(scope, replay_receive, send)
+        except DBAPIError as e:
+            if getattr(e.orig, "sqlstate", None) != QUERY_CANCELED:
+                raise
+            if not response_started:
+                await deadline_exceeded()(scope, replay_receive, send)
+
+
+def deadline_exceeded() -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Request deadline exceeded"},
+        headers=DEADLINE_EXCEEDED_HEADERS,
+    )
+
+
+def request_too_large() -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+        content={"detail": "Request body too large"},
+    )
+
+
+def get_deadline(request: Request) -> float | None:
+    """Return the request's deadline in event loop time, if it has one."""
+    timeout: asyncio.Timeout | None = getattr(request.state, "timeout", None)
+    return timeout.when() if timeout else None
+
+
+def deadline_passed(request: Request) -> bool:
+    """Whether the request's deadline has passed, checked before each step
+    taking a database connection, so expired requests are shed first."""
+    deadline = get_deadline(request)
+    return deadline is not None and deadline <= asyncio.get_running_loop().time()
+
+
+class RequestTimeout:
+    """Route dependency replacing the default request timeout of a route, or
+    removing it with `None`.
+
+    A shorter `X-Request-Timeout` sent by the client still takes precedence.
+    """
+
+    def __init__(self, seconds: float | None) -> None:
+        self.seconds = seconds
+
+    async def __call__(self, request: Request) -> None:
+        timeout: asyncio.Timeout | None = getattr(request.state, "timeout", None)
+        if timeout is None:
+            return
+
+        seconds = math.inf if self.seconds is None else self.seconds
+        deadline = min(
+            request.state.request_start + seconds, request.state.client_deadline
+        )
+        timeout.reschedule(deadline if deadline < math.inf else None)
@@ -0,0 +1,140 @@
+import asyncio
+import json
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+import asyncpg
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+
+EVENTS_CHANNEL = "app_events"
+
+# Sent instead of the buffered events to a subscriber that fell behind
+RESYNC_EVENT = json.dumps({"type": "resync"})
+
+
+async def publish(session: AsyncSession, owner_id: int, event: str, id: int) -> None:
+    """Publish a change event to the owner's subscribers on every worker.
+
+    The notification is sent in the session's transaction, so it is only
+    delivered once the change is committed.
+    """
+    payload = json.dumps({"owner_id": owner_id, "type": event, "id": id})
+    await session.execute(select(func.pg_notify(EVENTS_CHANNEL, payload)))
+
+
+class Broadcaster:
+    """Fan out the change events received over one LISTEN connection per
+    worker to the subscribers of this worker.
+
+    Each subscriber has a bounded buffer. When a slow client lets it fill up,
+    its backlog is replaced with a single resync event telling it to refetch.
+    """
+
+    def __init__(self, buffer_size: int = 100) -> None:
+        self.buffer_size = buffer_size
+        self.subscribers: defaultdict[int, set[asyncio.Queue[str | None]]] = (
+            defaultdict(set)
+        )
+        self.connection: asyncpg.Connection | None = None
+        self.lock = asyncio.Lock()
+        self.shutting_down = False
+
+    async def listen(self) -> None:
+        async with self.lock:
+            if self.connection is not None and not self.connection.is_closed():
+                return
+
+            self.connection = await asyncpg.connect(
+                host=config.pghost,
+                user=config.pguser,
+                password=config.pgpassword,
+                database=config.pgdatabase,
+                ssl=True,
+            )
+            self.connection.add_termination_listener(self.on_terminate)
+            await self.connection.add_listener(EVENTS_CHANNEL, self.on_notify)
+
+    async def close(self) -> None:
+        async with self.lock:
+            if self.connection is not None:
+                await self.connection.close()
+                self.connection = None
+
+    def on_notify(
+        self,
+        _connection: asyncpg.Connection,
+        _pid: int,
+        _channel: str,
+        payload: str,
+    ) -> None:
+        owner_id = json.loads(payload)["owner_id"]
+        for queue in self.subscribers.get(owner_id, ()):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC_EVENT)
+
+    def on_terminate(self, _connection: asyncpg.Connection) -> None:
+        # End every stream, clients reconnect and resubscribe on a new
+        # connection.
+        self.connection = None
+        self.end_streams()
+
+    def shut_down(self) -> None:
+        """End every stream, and the ones started from now on, so open
+        streams don't hold up the server's graceful shutdown. Clients
+        reconnect to another worker."""
+        self.shutting_down = True
+        self.end_streams()
+
+    def end_streams(self) -> None:
+        for queues in self.subscribers.values():
+            for queue in queues:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+    @asynccontextmanager
+    async def subscribe(
+        self, owner_id: int
+    ) -> AsyncIterator[asyncio.Queue[str | None]]:
+        await self.listen()
+
+        queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=self.buffer_size)
+        self.subscribers[owner_id].add(queue)
+        if self.shutting_down:
+            queue.put_nowait(None)
+        try:
+            yield queue
+        finally:
+            self.subscribers[owner_id].discard(queue)
+            if not self.subscribers[owner_id]:
+                del self.subscribers[owner_id]
+
+
+broadcaster = Broadcaster()
+
+
+async def stream_events(
+    owner_id: int, keepalive_seconds: float = 15
+) -> AsyncIterator[str]:
+    """Encode the owner's change events as a Server-Sent Events stream."""
+    async with broadcaster.subscribe(owner_id) as queue:
+        yield "retry: 5000\n\n"
+
+        while True:
+            try:
+                payload = await asyncio.wait_for(queue.get(), keepalive_seconds)
+            except TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+
+            if payload is None:
+                return
+            yield f"data: {payload}\n\n"
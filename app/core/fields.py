@@ -0,0 +1,87 @@
+"""Sparse fieldsets, from the `fields` query parameter.
+
+The requested fields select the columns loaded from the database and the
+schema the response is built with, which is created once per field set.
+"""
+
+from functools import cache
+from typing import Any, cast
+
+from fastapi import HTTPException, Response, status
+from pydantic import BaseModel, ConfigDict, create_model
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from app.core.db import Base
+from app.core.negotiation import NegotiatedResponse
+from app.models import FieldsParams
+
+
+def requested_fields(
+    params: FieldsParams, schema: type[BaseModel]
+) -> frozenset[str] | None:
+    """Return the requested fields of `schema`, always with the id, or none
+    when all of them are."""
+    if params.fields is None:
+        return None
+
+    fields = frozenset(params.fields.split(",")) | {"id"}
+    unknown = fields - schema.model_fields.keys()
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+        )
+
+    return fields
+
+
+@cache
+def sparse_schema(
+    schema: type[BaseModel], fields: frozenset[str] | None
+) -> type[BaseModel]:
+    """Return `schema` with only `fields`, in their order in `schema`."""
+    if fields is None:
+        return schema
+
+    definitions: dict[str, Any] = {
+        name: (field.annotation, field)
+        for name, field in schema.model_fields.items()
+        if name in fields
+    }
+    return create_model(
+        f"{schema.__name__}Sparse",
+        __config__=ConfigDict(from_attributes=True),
+        **definitions,
+    )
+
+
+def sparse_page[PageType: BaseModel](
+    page: type[PageType], schema: type[BaseModel], fields: frozenset[str] | None
+) -> type[PageType]:
+    """Return the generic `page` of `schema` with only `fields`, which
+    Pydantic creates once per schema."""
+    # Parametrized with a schema made at runtime, which type checkers cannot
+    # follow
+    return cast(Any, page)[sparse_schema(schema, fields)]
+
+
+def load_columns(
+    model: type[Base], fields: frozenset[str], *extra: str
+) -> LoaderOption:
+    """Load only the columns of `model` behind `fields`, and the `extra` ones
+    the handler reads, besides the primary key."""
+    columns = model.__table__.columns.keys()
+    return load_only(
+        *(
+            getattr(model, name)
+            for name in sorted(fields | set(extra))
+            if name in columns
+        )
+    )
+
+
+def sparse_response(content: BaseModel) -> Response:
+    """Send content built with a sparse schema as it is, instead of through
+    the route's response model, which would ask for the missing fields."""
+    return NegotiatedResponse(content.model_dump(mode="json"))
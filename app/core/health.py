@@ -0,0 +1,116 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from functools import cache
+from typing import cast
+
+from sqlalchemy import QueuePool, text
+
+from app.core.config import config
+from app.core.db import engine, max_overflow, pool_size
+
+logger = logging.getLogger(__name__)
+
+
+@cache
+def get_migrations() -> tuple[frozenset[str], frozenset[str]]:
+    """Return the heads of this build's migrations, and all their revisions."""
+    # Alembic is only loaded on the first readiness check, not on boot
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    script = ScriptDirectory.from_config(Config("alembic.ini"))
+    return (
+        frozenset(script.get_heads()),
+        frozenset(revision.revision for revision in script.walk_revisions()),
+    )
+
+
+def migrations_applied(revisions: frozenset[str]) -> bool:
+    """Whether the database has all of this build's migrations.
+
+    A revision this build does not know comes from a newer build, which
+    migrated during a rolling deploy. The instances of this build keep serving
+    until they are replaced, so only a build the database is behind waits.
+    """
+    heads, known = get_migrations()
+    return revisions == heads or (bool(revisions) and revisions.isdisjoint(known))
+
+
+@dataclass
+class DatabaseStatus:
+    reachable: bool
+    migrations: bool
+
+
+class ReadinessCheck:
+    """Check whether this worker can take more traffic.
+
+    The database is queried at most once per `interval` seconds, however often
+    the check runs, and not at all while the pool is saturated. The pool and
+    event loop checks cost no I/O.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.database: DatabaseStatus | None = None
+        self.checked_at = -float("inf")
+        self.lock = asyncio.Lock()
+
+    async def check_database(self) -> DatabaseStatus:
+        async with self.lock:
+            now = asyncio.get_running_loop().time()
+            if self.database is not None and now - self.checked_at < self.interval:
+                return self.database
+
+            try:
+                async with engine.connect() as connection:
+                    result = await connection.execute(
+                        text("SELECT version_num FROM alembic_version")
+                    )
+                    revisions = frozenset(result.scalars())
+                self.database = DatabaseStatus(
+                    reachable=True,
+                    migrations=await asyncio.to_thread(migrations_applied, revisions),
+                )
+            except Exception:
+                logger.warning("Readiness check could not query the database")
+                self.database = DatabaseStatus(reachable=False, migrations=False)
+
+            self.checked_at = now
+            return self.database
+
+    async def __call__(self) -> tuple[bool, dict]:
+        # Time for the callbacks already queued on the event loop to run
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.sleep(0)
+        event_loop_lag = loop.time() - start
+
+        # The pool is saturated once requests have to wait for a connection
+        # The engine is created with a queue pool, typed as any pool
+        checked_out = cast(QueuePool, engine.pool).checkedout()
+        pool_capacity = pool_size + max_overflow
+        saturated = checked_out >= pool_capacity
+
+        if saturated and self.database is not None:
+            database = self.database
+        else:
+            database = await self.check_database()
+
+        ready = (
+            database.reachable
+            and database.migrations
+            and not saturated
+            and event_loop_lag < config.max_event_loop_lag_seconds
+        )
+        return ready, {
+            "status": "ready" if ready else "unavailable",
+            "database": database.reachable,
+            "migrations": database.migrations,
+            "pool": {"checked_out": checked_out, "capacity": pool_capacity},
+            "event_loop_lag": round(event_loop_lag, 4),
+        }
+
+
+readiness_check = ReadinessCheck(config.health_check_interval_seconds)
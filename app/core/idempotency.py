@@ -0,0 +1,206 @@
+import asyncio
+import hashlib
+from datetime import timedelta
+from typing import cast
+
+from fastapi import Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import ColumnElement, delete, func, update
+from sqlalchemy.dialects.postgresql import insert
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.types import ASGIApp
+
+from app.core.config import config
+from app.core.db import async_session
+from app.core.deadline import deadline_exceeded, deadline_passed
+from app.core.security import get_token_subject
+from app.schema import IdempotencyKey
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+
+class IdempotencyMiddleware(BaseHTTPMiddleware):
+    """Replay the stored response of a POST request retried with the same
+    `Idempotency-Key` header, instead of running its handler again.
+
+    Keys are scoped to the authenticated user and kept in the
+    `idempotency_keys` table for `idempotency_key_ttl_hours`, after which the
+    purger deletes them. Identical
+    requests in flight in the same worker are coalesced, the ones in flight
+    in another worker get a `409 Conflict` to retry later.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        super().__init__(app)
+        self.pending: dict[tuple[str, str], asyncio.Event] = {}
+
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if request.method != "POST" or key is None:
+            return await call_next(request)
+
+        # Anonymous requests are left to the handler, which rejects them
+        subject = get_token_subject(request)
+        if subject is None:
+            return await call_next(request)
+
+        if not 1 <= len(key) <= 255:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={"detail": "Invalid Idempotency-Key"},
+            )
+
+        body = await request.body()
+        request_hash = hashlib.sha256(
+            b"\n".join(
+                [
+                    request.method.encode(),
+                    request.url.path.encode(),
+                    request.url.query.encode(),
+                    body,
+                ]
+            )
+        ).hexdigest()
+
+        pending_key = (subject, key)
+        while pending := self.pending.get(pending_key):
+            await pending.wait()
+
+        self.pending[pending_key] = event = asyncio.Event()
+        claimed = stored = False
+        try:
+            # Shed before claiming, which takes a database connection, as the
+            # wait for the same key may have used up the deadline
+            if deadline_passed(request):
+                return deadline_exceeded()
+            claimed = await claim_key(subject, key, request_hash)
+            if not claimed:
+                return await replay_key(subject, key, request_hash)
+
+            response = cast(StreamingResponse, await call_next(request))
+            # Chunks are the bytes of the handler's response messages
+            content = b"".join(
+                [cast(bytes, chunk) async for chunk in response.body_iterator]
+            )
+            if response.status_code < status.HTTP_500_INTERNAL_SERVER_ERROR:
+                await store_key(
+                    subject,
+                    key,
+                    status_code=response.status_code,
+                    content_type=response.headers.get("content-type"),
+                    content=content,
+                )
+                stored = True
+
+            return Response(
+                content=content,
+                status_code=response.status_code,
+                headers=dict(response.headers),
+            )
+        finally:
+            try:
+                # Free the key of a request that failed or was cancelled, like
+                # on a client disconnect or deadline, so that it can be retried
+                if claimed and not stored:
+                    await asyncio.shield(release_key(subject, key))
+            finally:
+                del self.pending[pending_key]
+                event.set()
+
+
+def key_expired() -> ColumnElement[bool]:
+    return IdempotencyKey.created_at < func.now() - timedelta(
+        hours=config.idempotency_key_ttl_hours
+    )
+
+
+async def claim_key(subject: str, key: str, request_hash: str) -> bool:
+    """Claim a key for a request, unless another request holds it. Expired
+    keys, and the ones whose request never stored its response within the
+    claim's lease, are taken over."""
+    lease_expired = IdempotencyKey.status_code.is_(None) & (
+        IdempotencyKey.created_at
+        < func.now() - timedelta(seconds=config.idempotency_claim_lease_seconds)
+    )
+
+    async with async_session() as session:
+        claimed = await session.scalar(
+            insert(IdempotencyKey)
+            .values(subject=subject, key=key, request_hash=request_hash)
+            .on_conflict_do_update(
+                index_elements=[IdempotencyKey.subject, IdempotencyKey.key],
+                set_={
+                    "request_hash": request_hash,
+                    "status_code": None,
+                    "content_type": None,
+                    "response_body": None,
+                    "created_at": func.now(),
+                },
+                where=key_expired() | lease_expired,
+            )
+            .returning(IdempotencyKey.key)
+        )
+
+        await session.commit()
+
+    return claimed is not None
+
+
+async def replay_key(subject: str, key: str, request_hash: str) -> Response:
+    async with async_session() as session:
+        record = await session.get(IdempotencyKey, (subject, key))
+
+    if record is not None and record.request_hash != request_hash:
+        return JSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+            content={"detail": "Idempotency-Key was used for a different request"},
+        )
+    if record is None or record.status_code is None:
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={"detail": "A request with this Idempotency-Key is in progress"},
+            headers={"Retry-After": "1"},
+        )
+
+    return Response(
+        content=record.response_body,
+        status_code=record.status_code,
+        media_type=record.content_type,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def store_key(
+    subject: str,
+    key: str,
+    *,
+    status_code: int,
+    content_type: str | None,
+    content: bytes,
+) -> None:
+    async with async_session() as session:
+        await session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.subject == subject)
+            .where(IdempotencyKey.key == key)
+            .values(
+                status_code=status_code,
+                content_type=content_type,
+                response_body=content,
+            )
+        )
+
+        await session.commit()
+
+
+async def release_key(subject: str, key: str) -> None:
+    async with async_session() as session:
+        await session.execute(
+            delete(IdempotencyKey)
+            .where(IdempotencyKey.subject == subject)
+            .where(IdempotencyKey.key == key)
+        )
+
+        await session.commit()
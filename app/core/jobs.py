@@ -0,0 +1,204 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from sqlalchemy import ColumnElement, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import config
+from app.core.db import async_session
+from app.schema import Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail the job without retrying it."""
+
+
+@dataclass
+class JobContext:
+    job_id: int
+    owner_id: int
+    payload: dict
+    attempt: int
+
+    async def report_progress(self, progress: float) -> None:
+        """Record the fraction of the job done, between 0 and 1, which also
+        extends the job's lease."""
+        async with async_session() as session:
+            await session.execute(
+                update(Job)
+                .where(Job.id == self.job_id)
+                .where(Job.attempts == self.attempt)
+                .values(progress=progress, locked_until=lease_end())
+            )
+            await session.commit()
+
+
+type JobHandler = Callable[[JobContext], Awaitable[dict | None]]
+
+handlers: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Register the handler of a kind of job. Its return value is stored as
+    the job's result."""
+
+    def register(handler: JobHandler) -> JobHandler:
+        handlers[kind] = handler
+        return handler
+
+    return register
+
+
+def lease_end() -> ColumnElement[datetime]:
+    return func.now() + timedelta(seconds=config.job_lease_seconds)
+
+
+async def enqueue(
+    session: AsyncSession, owner_id: int, kind: str, payload: dict
+) -> Job:
+    """Queue a job in the session's transaction, so it only runs once the
+    transaction commits."""
+    job = Job(
+        owner_id=owner_id,
+        kind=kind,
+        payload=payload,
+        max_attempts=config.job_max_attempts,
+    )
+    session.add(job)
+    await session.flush()
+
+    return job
+
+
+async def claim_job() -> Job | None:
+    """Claim the next job due, or a running one whose lease expired, skipping
+    the ones other workers are claiming."""
+    now = func.now()
+    claimable = (
+        select(Job.id)
+        .where(
+            ((Job.status == "queued") & (Job.run_at <= now))
+            | ((Job.status == "running") & (Job.locked_until < now))
+        )
+        .order_by(Job.run_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    async with async_session() as session:
+        job = await session.scalar(
+            update(Job)
+            .where(Job.id == claimable)
+            .values(
+                status="running", attempts=Job.attempts + 1, locked_until=lease_end()
+            )
+            .returning(Job)
+        )
+        await session.commit()
+
+    return job
+
+
+async def finish_job(job: Job, **values: object) -> None:
+    # Unless the lease expired and another worker claimed the job since
+    async with async_session() as session:
+        await session.execute(
+            update(Job)
+            .where(Job.id == job.id)
+            .where(Job.attempts == job.attempts)
+            .values(**values)
+        )
+        await session.commit()
+
+
+async def run_job(job: Job) -> None:
+    context = JobContext(
+        job_id=job.id, owner_id=job.owner_id, payload=job.payload, attempt=job.attempts
+    )
+    try:
+        handler = handlers.get(job.kind)
+        if handler is None:
+            raise JobFailed(f"Unknown job kind {job.kind!r}")
+        if job.attempts > job.max_attempts:
+            raise JobFailed("Job timed out")
+
+        result = await handler(context)
+    except asyncio.CancelledError:
+        # Shutting down, let another worker run it without waiting on the lease
+        await asyncio.shield(
+            finish_job(
+                job, status="queued", attempts=job.attempts - 1, locked_until=None
+            )
+        )
+        raise
+    except Exception as error:
+        retry = not isinstance(error, JobFailed) and job.attempts < job.max_attempts
+        if retry:
+            logger.warning("Job %d failed, retrying", job.id, exc_info=True)
+            delay = min(
+                config.job_retry_delay_seconds * 2 ** (job.attempts - 1),
+                config.job_max_retry_delay_seconds,
+            )
+            await finish_job(
+                job,
+                status="queued",
+                run_at=func.now() + timedelta(seconds=delay),
+                locked_until=None,
+                error=str(error)[:500],
+            )
+        else:
+            logger.exception("Job %d failed", job.id)
+            await finish_job(
+                job,
+                status="failed",
+                locked_until=None,
+                error=str(error)[:500],
+                finished_at=func.now(),
+            )
+    else:
+        await finish_job(
+            job,
+            status="succeeded",
+            progress=1,
+            result=result,
+            locked_until=None,
+            error=None,
+            finished_at=func.now(),
+        )
+
+
+class JobWorker:
+    """Run queued jobs with `concurrency` asyncio tasks, each claiming one job
+    at a time with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers
+    can share the queue in Postgres."""
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+
+    async def run(self) -> None:
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(self.concurrency):
+                tg.create_task(self.work())
+
+    async def work(self) -> None:
+        while True:
+            try:
+                job = await claim_job()
+            except Exception:
+                logger.warning("Could not claim a job", exc_info=True)
+                job = None
+
+            if job is None:
+                await asyncio.sleep(config.job_poll_interval_seconds)
+                continue
+
+            try:
+                await run_job(job)
+            except Exception:
+                # Left to be claimed again once its lease expires
+                logger.warning("Could not record the outcome of job %d", job.id)
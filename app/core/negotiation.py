@@ -0,0 +1,59 @@
+from collections.abc import Mapping
+from contextvars import ContextVar
+from typing import cast
+
+import msgpack
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+accepts_msgpack: ContextVar[bool] = ContextVar("accepts_msgpack", default=False)
+
+
+def prefers_msgpack(accept: str) -> bool:
+    """Whether the client's Accept header names MessagePack, with a weight
+    at least that of JSON. Clients accepting anything get JSON."""
+    weights: dict[str, float] = {}
+    for item in accept.split(","):
+        media_type, *params = item.split(";")
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[media_type.strip().lower()] = weight
+
+    msgpack_weight = weights.get(MSGPACK_MEDIA_TYPE, 0.0)
+    json_weight = weights.get(
+        "application/json", weights.get("application/*", weights.get("*/*", 0.0))
+    )
+    return msgpack_weight > 0 and msgpack_weight >= json_weight
+
+
+async def negotiate_media_type(request: Request) -> None:
+    """Note whether the client asks for MessagePack, for `NegotiatedResponse`.
+
+    Async, so it runs in the request's context rather than a thread.
+    """
+    accepts_msgpack.set(prefers_msgpack(request.headers.get("accept", "")))
+
+
+class NegotiatedResponse(JSONResponse):
+    """A response encoded as MessagePack for the clients that accept it, which
+    is smaller and faster to decode than JSON for large pages, and as JSON
+    otherwise."""
+
+    def render(self, content: object) -> bytes:
+        if accepts_msgpack.get():
+            self.media_type = MSGPACK_MEDIA_TYPE
+            # Typed as optional, but packb always returns the packed bytes
+            return cast(bytes, msgpack.packb(content))
+        return super().render(content)
+
+    def init_headers(self, headers: Mapping[str, str] | None = None) -> None:
+        super().init_headers(headers)
+        self.headers.add_vary_header("Accept")
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+from typing import cast
+
+from sqlalchemy import CursorResult, Delete, delete, exists, select, tuple_
+
+from app.core.config import config
+from app.core.db import async_session, pool_ready
+from app.core.idempotency import key_expired
+from app.schema import ArchivedTask, IdempotencyKey, Project, Task
+
+logger = logging.getLogger(__name__)
+
+
+def delete_tasks(model: type[Task] | type[ArchivedTask], batch_size: int) -> Delete:
+    deleted = (
+        select(model.id, model.owner_id)
+        .where(model.deleted_at.is_not(None))
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(model).where(tuple_(model.id, model.owner_id).in_(deleted))
+
+
+def delete_projects(batch_size: int) -> Delete:
+    # Once their tasks are purged, so the cascade has nothing left to delete
+    deleted = (
+        select(Project.id)
+        .where(Project.deleted_at.is_not(None))
+        .where(
+            ~exists()
+            .where(Task.project_id == Project.id)
+            .where(Task.owner_id == Project.owner_id)
+        )
+        .where(
+            ~exists()
+            .where(ArchivedTask.project_id == Project.id)
+            .where(ArchivedTask.owner_id == Project.owner_id)
+        )
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(Project).where(Project.id.in_(deleted))
+
+
+def delete_expired_keys(batch_size: int) -> Delete:
+    # Through the index on created_at, for every user at once
+    expired = (
+        select(IdempotencyKey.subject, IdempotencyKey.key)
+        .where(key_expired())
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return delete(IdempotencyKey).where(
+        tuple_(IdempotencyKey.subject, IdempotencyKey.key).in_(expired)
+    )
+
+
+async def purge_deleted(batch_size: int) -> int:
+    """Hard delete up to `batch_size` soft deleted rows of each table, and
+    expired idempotency keys, in one short transaction per table. Returns the
+    number of rows deleted."""
+    purged = 0
+    for statement in (
+        delete_tasks(Task, batch_size),
+        delete_tasks(ArchivedTask, batch_size),
+        delete_projects(batch_size),
+        delete_expired_keys(batch_size),
+    ):
+        async with async_session() as session:
+            result = cast(
+                CursorResult,
+                await session.execute(
+                    statement,
+                    execution_options={
+                        "include_deleted": True,
+                        "synchronize_session": False,
+                    },
+                ),
+            )
+            await session.commit()
+        purged += result.rowcount
+
+    return purged
+
+
+async def run_purger() -> None:
+    """Purge soft deleted rows every `purge_interval_seconds`, pausing
+    `purge_batch_delay_seconds` between batches to leave room for requests."""
+    await pool_ready.wait()
+    while True:
+        try:
+            purged = 0
+            while batch := await purge_deleted(config.purge_batch_size):
+                purged += batch
+                await asyncio.sleep(config.purge_batch_delay_seconds)
+            if purged:
+                logger.info("Purged %d deleted rows", purged)
+        except Exception:
+            logger.exception("Could not purge deleted rows")
+
+        await asyncio.sleep(config.purge_interval_seconds)
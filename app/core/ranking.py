@@ -0,0 +1,92 @@
+"""Lexicographic ranks for manual ordering.
+
+A rank is a base 62 fraction written without its leading "0.", so ranks sort
+like the fractions they stand for when compared byte by byte. There is always
+room for a rank between two others, so moving an item only rewrites its own
+rank. Ranks never end in "0", which would make two ranks of equal value.
+"""
+
+import base64
+import json
+import math
+
+DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+
+
+def rank_between(before: str | None, after: str | None) -> str:
+    """Return a rank sorting after `before` and before `after`, either of which
+    may be missing at the ends of the list."""
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"{before!r} does not sort before {after!r}")
+
+    if before and after is None:
+        return successor(before)
+    return midpoint(before or "", after)
+
+
+def successor(low: str) -> str:
+    """Return a short rank after `low`, for appending to a list.
+
+    Bumps the first digit below the highest one and drops the rest, so ranks
+    grow by a digit every `BASE - 1` appends rather than every few, as they
+    would by halving the room left.
+    """
+    prefix = len(low) - len(low.lstrip(DIGITS[-1]))
+    digit = DIGITS.index(low[prefix]) if prefix < len(low) else 0
+    return low[:prefix] + DIGITS[digit + 1]
+
+
+def midpoint(low: str, high: str | None) -> str:
+    if high is not None:
+        # Keep the common prefix, treating the missing digits of `low` as 0
+        prefix = 0
+        while prefix < len(high) and (low[prefix : prefix + 1] or "0") == high[prefix]:
+            prefix += 1
+        if prefix:
+            return high[:prefix] + midpoint(low[prefix:], high[prefix:])
+
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+
+    # The first digits are consecutive
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + midpoint(low[1:], None)
+
+
+def spaced_ranks(count: int) -> list[str]:
+    """Return `count` ascending ranks of equal length, spread evenly, leaving
+    the same room between any two of them."""
+    width = math.ceil(math.log(count + 1, BASE)) + 1
+    step = BASE**width // (count + 1)
+
+    ranks: list[str] = []
+    for position in range(1, count + 1):
+        value = position * step
+        digits = []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        ranks.append("".join(reversed(digits)).rstrip("0"))
+
+    return ranks
+
+
+def encode_cursor(rank: str, id: int) -> str:
+    """Return an opaque cursor to resume a list ordered by (rank, id) after
+    the given item."""
+    return base64.urlsafe_b64encode(json.dumps([rank, id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    try:
+        rank, id = json.loads(base64.urlsafe_b64decode(cursor))
+    except (ValueError, TypeError) as error:
+        raise ValueError("Invalid cursor") from error
+    if not isinstance(rank, str) or not isinstance(id, int):
+        raise ValueError("Invalid cursor")
+
+    return rank, id
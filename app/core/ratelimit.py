@@ -0,0 +1,177 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Protocol
+
+from fastapi import Request, Response, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.types import ASGIApp
+
+from app.core.config import config
+from app.core.db import async_session
+from app.core.deadline import deadline_exceeded, deadline_passed
+from app.core.security import get_token_subject
+from app.schema import RateLimitBucket
+
+# Unauthenticated endpoints that are limited per client IP
+AUTH_PATHS = {"/token", "/users"}
+
+# Never limited, so the probes still reach an overloaded worker
+UNLIMITED_PATH_PREFIXES = ("/health",)
+
+
+class RateLimiter(Protocol):
+    async def acquire(self, key: str, *, capacity: int, rate: float) -> float:
+        """Take a token from the bucket of `key`, refilled at `rate` tokens per
+        second up to `capacity`. Return 0 if the request is allowed, or the
+        number of seconds to wait before retrying."""
+        ...
+
+
+class MemoryRateLimiter:
+    """Token buckets kept in the worker's memory, for single-node setups."""
+
+    def __init__(self, max_keys: int = 10_000) -> None:
+        self.max_keys = max_keys
+        self.buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def acquire(self, key: str, *, capacity: int, rate: float) -> float:
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.pop(key, (float(capacity), now))
+        tokens = min(float(capacity), tokens + (now - updated_at) * rate)
+
+        retry_after = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            retry_after = (1 - tokens) / rate
+
+        self.buckets[key] = (tokens, now)
+        if len(self.buckets) > self.max_keys:
+            self.buckets.popitem(last=False)
+
+        return retry_after
+
+
+class PostgresRateLimiter:
+    """Token buckets kept in the unlogged `rate_limit_buckets` table and shared
+    by every worker, each take being a single upsert."""
+
+    async def acquire(self, key: str, *, capacity: int, rate: float) -> float:
+        refilled = func.least(
+            capacity,
+            RateLimitBucket.tokens
+            + func.extract("epoch", func.now() - RateLimitBucket.updated_at) * rate,
+        )
+
+        async with async_session() as session:
+            taken = await session.scalar(
+                insert(RateLimitBucket)
+                .values(key=key, tokens=capacity - 1)
+                .on_conflict_do_update(
+                    index_elements=[RateLimitBucket.key],
+                    set_={"tokens": refilled - 1, "updated_at": func.now()},
+                    where=refilled >= 1,
+                )
+                .returning(RateLimitBucket.tokens)
+            )
+
+            await session.commit()
+            if taken is not None:
+                return 0.0
+
+            # Until the bucket refills the rest of a token
+            tokens = await session.scalar(
+                select(refilled).where(RateLimitBucket.key == key)
+            )
+
+        return (1 - float(tokens or 0)) / rate
+
+
+def get_rate_limiter() -> RateLimiter:
+    if config.rate_limit_backend == "postgres":
+        return PostgresRateLimiter()
+    return MemoryRateLimiter()
+
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """Limit the request rate per user, or per client IP on the auth endpoints,
+    and the number of requests each user has in flight.
+
+    In-flight requests are capped per worker, which is what bounds the use of
+    the worker's own connection pool.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter | None = None) -> None:
+        super().__init__(app)
+        self.limiter = limiter or get_rate_limiter()
+        self.in_flight: dict[str, int] = {}
+
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        if request.url.path.startswith(UNLIMITED_PATH_PREFIXES):
+            return await call_next(request)
+        # Shed before the limiter, which may take a database connection
+        if deadline_passed(request):
+            return deadline_exceeded()
+
+        if request.url.path in AUTH_PATHS and request.method == "POST":
+            client = get_client_ip(request)
+            retry_after = await self.limiter.acquire(
+                f"ip:{client}",
+                capacity=config.auth_rate_limit_per_minute,
+                rate=config.auth_rate_limit_per_minute / 60,
+            )
+            if retry_after:
+                return too_many_requests(retry_after)
+            return await call_next(request)
+
+        subject = get_token_subject(request)
+        if subject is None:
+            return await call_next(request)
+
+        # Checked first, as it takes no database connection to reject a burst
+        in_flight = self.in_flight.get(subject, 0)
+        if in_flight >= config.max_concurrent_requests_per_user:
+            return too_many_requests(1)
+
+        self.in_flight[subject] = in_flight + 1
+        try:
+            retry_after = await self.limiter.acquire(
+                f"user:{subject}",
+                capacity=config.rate_limit_per_minute,
+                rate=config.rate_limit_per_minute / 60,
+            )
+            if retry_after:
+                return too_many_requests(retry_after)
+
+            return await call_next(request)
+        finally:
+            self.in_flight[subject] -= 1
+            if not self.in_flight[subject]:
+                del self.in_flight[subject]
+
+
+def get_client_ip(request: Request) -> str:
+    """Return the client's IP, from `client_ip_header` when the proxy sets it.
+
+    Forwarded headers are not trusted from any peer, as a client could send a
+    new address with every request to get a fresh bucket.
+    """
+    if config.client_ip_header and (
+        client := request.headers.get(config.client_ip_header)
+    ):
+        return client
+    return request.client.host if request.client else "unknown"
+
+
+def too_many_requests(retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        content={"detail": "Too many requests"},
+        headers={"Retry-After": str(math.ceil(retry_after))},
+    )
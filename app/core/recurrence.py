@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+from typing import cast
+
+from sqlalchemy import (
+    ColumnElement,
+    DateTime,
+    Float,
+    Integer,
+    Select,
+    Subquery,
+    case,
+    exists,
+    func,
+    select,
+    true,
+    type_coerce,
+    union_all,
+)
+
+from app.core.config import config
+from app.schema import Task, TaskOccurrence
+
+
+def days_between(
+    end: ColumnElement[datetime], start: ColumnElement[datetime]
+) -> ColumnElement[float]:
+    return type_coerce(func.extract("epoch", end - start) / 86400, Float)
+
+
+def select_occurrences(
+    owner_id: int,
+    timezone: str,
+    start: ColumnElement[datetime],
+    end: ColumnElement[datetime],
+    *,
+    open_only: bool = True,
+) -> Select[tuple[int, datetime]]:
+    """Select the occurrences of the owner's recurring tasks due in
+    [start, end), as (task_id, due_date) rows, leaving out completed and
+    skipped ones unless `open_only` is false.
+
+    Occurrences are expanded from the rules in the query, and only the periods
+    of each rule that overlap the range are generated, so the cost follows the
+    length of the range, not the age of the rule.
+    """
+    recurrence = Task.recurrence
+    frequency = recurrence["frequency"].astext
+    interval = recurrence["interval"].as_integer()
+
+    # Recurring tasks always have a due date
+    due_date = cast(ColumnElement[datetime], Task.due_date)
+    local_due_date = func.timezone(timezone, due_date)
+    due_weekday = func.extract("isodow", local_due_date).cast(Integer)
+
+    period_days = case(
+        (frequency == "daily", interval),
+        (frequency == "weekly", 7 * interval),
+        else_=0,
+    )
+    period_months = case((frequency == "monthly", interval), else_=0)
+
+    # Bounds of the period numbers in the range, from the shortest and longest
+    # a period can be, with a period of slack for weekdays before the due date
+    shortest_days = case((frequency == "monthly", 28 * interval), else_=period_days)
+    longest_days = case((frequency == "monthly", 31 * interval), else_=period_days)
+    first_period = func.greatest(
+        0, func.floor(days_between(start, due_date) / longest_days) - 1
+    ).cast(Integer)
+    last_period = (func.floor(days_between(end, due_date) / shortest_days) + 1).cast(
+        Integer
+    )
+
+    periods = (
+        func.generate_series(first_period, last_period)
+        .table_valued("period")
+        .lateral("periods")
+    )
+    weekdays = (
+        func.jsonb_array_elements_text(
+            func.coalesce(recurrence["weekdays"], func.jsonb_build_array(due_weekday))
+        )
+        .table_valued("weekday")
+        .lateral("weekdays")
+    )
+
+    occurrence_due_date = func.timezone(
+        timezone,
+        local_due_date
+        + func.make_interval(
+            0,
+            periods.c.period * period_months,
+            0,
+            periods.c.period * period_days
+            + weekdays.c.weekday.cast(Integer)
+            - due_weekday,
+        ),
+    )
+    occurrences = (
+        select(
+            Task.id.label("task_id"),
+            occurrence_due_date.label("due_date"),
+            recurrence["until"].astext.cast(DateTime(timezone=True)).label("until"),
+            Task.due_date.label("first_due_date"),
+        )
+        .join(periods, true())
+        .join(weekdays, true())
+        .where(Task.owner_id == owner_id)
+        .where(recurrence.is_not(None))
+        .where(~Task.completed)
+        .subquery()
+    )
+
+    query = (
+        select(occurrences.c.task_id, occurrences.c.due_date)
+        .where(occurrences.c.due_date >= start)
+        .where(occurrences.c.due_date < end)
+        .where(occurrences.c.due_date >= occurrences.c.first_due_date)
+        .where(
+            occurrences.c.until.is_(None)
+            | (occurrences.c.due_date <= occurrences.c.until)
+        )
+    )
+    if open_only:
+        query = query.where(
+            ~exists()
+            .where(TaskOccurrence.task_id == occurrences.c.task_id)
+            .where(TaskOccurrence.due_date == occurrences.c.due_date)
+        )
+
+    return query
+
+
+def select_due_tasks(
+    owner_id: int,
+    timezone: str,
+    start: ColumnElement[datetime] | None = None,
+    end: ColumnElement[datetime] | None = None,
+) -> Subquery:
+    """Select the owner's open one-off tasks and occurrences of recurring tasks
+    due in [start, end), as (task_id, due_date) rows.
+
+    A missing bound leaves one-off tasks unbounded on that side, while
+    recurring tasks are expanded up to `recurrence_horizon_days` from now.
+    """
+    horizon = timedelta(days=config.recurrence_horizon_days)
+
+    one_off = (
+        select(Task.id.label("task_id"), Task.due_date)
+        .where(Task.owner_id == owner_id)
+        .where(Task.recurrence.is_(None))
+        .where(~Task.completed)
+    )
+    if start is not None:
+        one_off = one_off.where(Task.due_date >= start)
+    if end is not None:
+        one_off = one_off.where(Task.due_date < end)
+
+    occurrences = select_occurrences(
+        owner_id,
+        timezone,
+        start if start is not None else func.now() - horizon,
+        end if end is not None else func.now() + horizon,
+    )
+
+    return union_all(one_off, occurrences).subquery()
@@ -0,0 +1,89 @@
+import re
+import time
+
+from fastapi import Request, Response
+from sqlalchemy import text
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+
+from app.core.config import config
+from app.core.db import async_replica_session, async_session
+from app.core.security import get_token_subject
+
+COMMIT_LSN_HEADER = "X-Commit-LSN"
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Monotonic time of the last write of each user in this worker
+last_writes: dict[str, float] = {}
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """Remember which users just wrote, so their reads stick to the primary
+    for `replica_stickiness_seconds`, and return the primary's WAL position
+    after the write in `X-Commit-LSN`.
+
+    Clients send that header back on later reads, which then only use the
+    replica once it has replayed past that position, on any worker.
+    """
+
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        response = await call_next(request)
+        if (
+            async_replica_session is None
+            or request.method in SAFE_METHODS
+            or response.status_code >= 400
+        ):
+            return response
+
+        subject = get_token_subject(request)
+        if subject is None:
+            return response
+
+        record_write(subject)
+
+        async with async_session() as session:
+            lsn = await session.scalar(text("SELECT pg_current_wal_lsn()::text"))
+
+        response.headers[COMMIT_LSN_HEADER] = lsn
+        return response
+
+
+def record_write(subject: str) -> None:
+    now = time.monotonic()
+    last_writes[subject] = now
+
+    if len(last_writes) > 10_000:
+        for key, written_at in list(last_writes.items()):
+            if now - written_at > config.replica_stickiness_seconds:
+                del last_writes[key]
+
+
+async def can_read_from_replica(request: Request) -> bool:
+    if async_replica_session is None or request.method not in SAFE_METHODS:
+        return False
+
+    subject = get_token_subject(request)
+    if subject is not None:
+        written_at = last_writes.get(subject)
+        if (
+            written_at is not None
+            and time.monotonic() - written_at < config.replica_stickiness_seconds
+        ):
+            return False
+
+    lsn = request.headers.get(COMMIT_LSN_HEADER)
+    if lsn is None:
+        return True
+    if not re.fullmatch(r"[0-9A-Fa-f]{1,8}/[0-9A-Fa-f]{1,8}", lsn):
+        return False
+
+    async with async_replica_session() as session:
+        caught_up = await session.scalar(
+            text("SELECT pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn)"),
+            {"lsn": lsn},
+        )
+
+    # A primary standing in for the replica has no replay position
+    return caught_up is not False
@@ -1,23 +1,36 @@
+from __future__ import annotations
+
 from datetime import UTC, datetime, timedelta
+from functools import cache
+from typing import TYPE_CHECKING
 
 import jwt
+from fastapi import Request
 from fastapi.security import OAuth2PasswordBearer
-from pwdlib import PasswordHash
+from fastapi.security.utils import get_authorization_scheme_param
 
 from app.core.config import config
 
+if TYPE_CHECKING:
+    from pwdlib import PasswordHash
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/token")
 
 
-password_hash = PasswordHash.recommended()
+@cache
+def get_password_hash() -> PasswordHash:
+    """Build the argon2 hasher on first use, only login and sign up need it."""
+    from pwdlib import PasswordHash
+
+    return PasswordHash.recommended()
 
 
 def hash_password(password: str) -> str:
-    return password_hash.hash(password)
+    return get_password_hash().hash(password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return password_hash.verify(plain_password, hashed_password)
+    return get_password_hash().verify(plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -51,3 +64,12 @@ def verify_token(token: str) -> str | None:
         return None
     else:
         return payload.get("sub")
+
+
+def get_token_subject(request: Request) -> str | None:
+    """Return the subject of the request's bearer token if it is valid."""
+    scheme, token = get_authorization_scheme_param(request.headers.get("Authorization"))
+    if scheme.lower() != "bearer" or not token:
+        return None
+
+    return verify_token(token)
@@ -1,30 +1,87 @@
 from collections.abc import AsyncGenerator
 from typing import Annotated
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.db import async_session
+from app.core.db import async_replica_session, async_session, set_statement_timeout
+from app.core.deadline import DEADLINE_EXCEEDED_HEADERS, deadline_passed, get_deadline
+from app.core.replica import can_read_from_replica
 from app.core.security import oauth2_scheme, verify_token
-from app.models import PaginationParams
+from app.models import (
+    CursorPaginationParams,
+    FieldsParams,
+    PaginationParams,
+    TaskExpandParams,
+    UsageParams,
+)
 from app.schema import User
 
 PaginationParamsDep = Annotated[PaginationParams, Depends()]
 
 
+CursorPaginationParamsDep = Annotated[CursorPaginationParams, Depends()]
+
+
+TaskExpandParamsDep = Annotated[TaskExpandParams, Depends()]
+
+
+UsageParamsDep = Annotated[UsageParams, Depends()]
+
+
+FieldsParamsDep = Annotated[FieldsParams, Depends()]
+
+
 TokenDep = Annotated[str, Depends(oauth2_scheme)]
 
 
-async def get_session() -> AsyncGenerator[AsyncSession]:
+def check_deadline(request: Request) -> float | None:
+    if deadline_passed(request):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Request deadline exceeded",
+            headers=DEADLINE_EXCEEDED_HEADERS,
+        )
+
+    return get_deadline(request)
+
+
+async def get_session(request: Request) -> AsyncGenerator[AsyncSession]:
+    deadline = check_deadline(request)
+
     async with async_session() as session:
+        if deadline is not None:
+            set_statement_timeout(session, deadline)
         yield session
 
 
 SessionDep = Annotated[AsyncSession, Depends(get_session)]
 
 
-async def get_current_user(token: TokenDep, session: SessionDep) -> User:
+async def get_read_session(
+    request: Request, session: SessionDep
+) -> AsyncGenerator[AsyncSession]:
+    """Yield a replica session for reads that can tolerate replication lag,
+    and the primary session otherwise."""
+    # Before the replication lag check, which takes a replica connection
+    deadline = check_deadline(request)
+    if async_replica_session is None or not await can_read_from_replica(request):
+        yield session
+        return
+
+    async with async_replica_session() as replica_session:
+        if deadline is not None:
+            set_statement_timeout(replica_session, deadline)
+        yield replica_session
+
+
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session)]
+
+
+async def get_current_user(
+    token: TokenDep, session: ReadSessionDep, primary_session: SessionDep
+) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Invalid authentication credentials",
@@ -35,7 +92,11 @@ async def get_current_user(token: TokenDep, session: SessionDep) -> User:
     if username is None:
         raise credentials_exception
 
-    user = await session.scalar(select(User).where(User.username.ilike(username)))
+    query = select(User).where(User.username.ilike(username))
+    user = await session.scalar(query)
+    if not user and session is not primary_session:
+        # The user may have just signed up and not reached the replica yet
+        user = await primary_session.scalar(query)
     if not user:
         raise credentials_exception
 
@@ -0,0 +1,209 @@
+from sqlalchemy import (
+    ARRAY,
+    Integer,
+    String,
+    column,
+    func,
+    insert,
+    literal,
+    select,
+    update,
+    values,
+)
+
+from app.core.db import async_session
+from app.core.events import publish
+from app.core.jobs import JobContext, JobFailed, job_handler
+from app.core.ranking import spaced_ranks
+from app.schema import Project, Task, TaskLabel
+
+# Tasks copied per statement, with the job's progress reported in between
+DUPLICATE_BATCH_SIZE = 1000
+# Tasks given a new rank per statement
+REBALANCE_BATCH_SIZE = 1000
+
+
+@job_handler("project.duplicate")
+async def duplicate_project(context: JobContext) -> dict:
+    """Copy a project with its tasks, their subtask tree and their labels, in
+    one transaction so a retry starts over from a clean slate."""
+    project_id = context.payload["project_id"]
+
+    async with async_session() as session:
+        project = await session.get(Project, project_id)
+        if not project or project.owner_id != context.owner_id:
+            raise JobFailed("Project not found")
+
+        db_project = Project(
+            title=f"{project.title} (Copy)",
+            color=project.color,
+            owner_id=context.owner_id,
+        )
+
+        session.add(db_project)
+
+        await session.flush()
+
+        result = await session.execute(
+            select(Task.id, Task.path)
+            .where(Task.project_id == project_id)
+            .where(Task.owner_id == context.owner_id)
+            .order_by(Task.id)
+        )
+        paths = dict(result.tuples().all())
+        task_ids = list(paths)
+        new_ids: dict[int, int] = {}
+
+        for start in range(0, len(task_ids), DUPLICATE_BATCH_SIZE):
+            batch = task_ids[start : start + DUPLICATE_BATCH_SIZE]
+
+            # Allocate the new task ids up front, so the old -> new id mapping
+            # is available to copy the task_labels links in the same statement.
+            source_tasks = (
+                select(
+                    Task.id.label("old_id"),
+                    func.nextval(func.pg_get_serial_sequence("tasks", "id")).label(
+                        "new_id"
+                    ),
+                    Task.title,
+                    Task.description,
+                    Task.priority,
+                    Task.completed,
+                    Task.completed_at,
+                    Task.due_date,
+                    Task.recurrence,
+                    Task.rank,
+                )
+                .where(Task.id.in_(batch))
+                .where(Task.owner_id == context.owner_id)
+                .cte("source_tasks")
+            )
+            copied_tasks = (
+                insert(Task)
+                .from_select(
+                    [
+                        "id",
+                        "title",
+                        "description",
+                        "priority",
+                        "completed",
+                        "completed_at",
+                        "due_date",
+                        "recurrence",
+                        "rank",
+                        "owner_id",
+                        "project_id",
+                    ],
+                    select(
+                        source_tasks.c.new_id,
+                        source_tasks.c.title,
+                        source_tasks.c.description,
+                        source_tasks.c.priority,
+                        source_tasks.c.completed,
+                        source_tasks.c.completed_at,
+                        source_tasks.c.due_date,
+                        source_tasks.c.recurrence,
+                        source_tasks.c.rank,
+                        literal(context.owner_id),
+                        literal(db_project.id),
+                    ),
+                )
+                .returning(Task.id)
+                .cte("copied_tasks")
+            )
+            copied_labels = (
+                insert(TaskLabel)
+                .from_select(
+                    ["task_id", "label_id", "owner_id"],
+                    select(
+                        source_tasks.c.new_id, TaskLabel.label_id, TaskLabel.owner_id
+                    )
+                    .join(source_tasks, TaskLabel.task_id == source_tasks.c.old_id)
+                    .where(TaskLabel.owner_id == context.owner_id),
+                )
+                .returning(TaskLabel.task_id)
+                .cte("copied_labels")
+            )
+            result = await session.execute(
+                select(source_tasks.c.old_id, source_tasks.c.new_id)
+                .add_cte(copied_tasks)
+                .add_cte(copied_labels)
+            )
+            new_ids.update(result.tuples())
+
+            await context.report_progress((start + len(batch)) / len(task_ids))
+
+        # Subtasks are copied without their parents, which may be copied in a
+        # later batch, and are attached to the copies of their ancestors once
+        # all are copied. Ancestors outside the project are left out.
+        rows = []
+        for old_id, path in paths.items():
+            new_path = [new_ids[id] for id in path if id in new_ids]
+            if new_path:
+                rows.append((new_ids[old_id], new_path[-1], new_path))
+
+        for start in range(0, len(rows), DUPLICATE_BATCH_SIZE):
+            new_parents = values(
+                column("id", Integer),
+                column("parent_id", Integer),
+                column("path", ARRAY(Integer)),
+                name="new_parents",
+            ).data(rows[start : start + DUPLICATE_BATCH_SIZE])
+            await session.execute(
+                update(Task)
+                .where(Task.owner_id == context.owner_id)
+                .where(Task.id == new_parents.c.id)
+                .values(parent_id=new_parents.c.parent_id, path=new_parents.c.path)
+                .execution_options(synchronize_session=False)
+            )
+
+        await publish(session, context.owner_id, "project.created", db_project.id)
+        await session.commit()
+
+    return {"project_id": db_project.id}
+
+
+@job_handler("tasks.rebalance")
+async def rebalance_tasks(context: JobContext) -> dict:
+    """Respace the ranks of a project's tasks evenly, keeping their order, so
+    the ones grown long from repeated moves get short again."""
+    project_id = context.payload["project_id"]
+
+    async with async_session() as session:
+        in_project = (
+            Task.project_id.is_(None)
+            if project_id is None
+            else Task.project_id == project_id
+        )
+        result = await session.execute(
+            select(Task.id, Task.rank)
+            .where(Task.owner_id == context.owner_id)
+            .where(in_project)
+            .with_for_update()
+        )
+        # Sorted once locked, as rows locked while being reordered come back
+        # with their new rank
+        task_ids = [id for id, _ in sorted(result, key=lambda row: (row.rank, row.id))]
+        rows = list(zip(task_ids, spaced_ranks(len(task_ids)), strict=True))
+
+        for start in range(0, len(rows), REBALANCE_BATCH_SIZE):
+            new_ranks = values(
+                column("id", Integer), column("rank", String), name="new_ranks"
+            ).data(rows[start : start + REBALANCE_BATCH_SIZE])
+            await session.execute(
+                update(Task)
+                .where(Task.owner_id == context.owner_id)
+                .where(Task.id == new_ranks.c.id)
+                .values(rank=new_ranks.c.rank)
+                .execution_options(synchronize_session=False)
+            )
+
+            await context.report_progress(
+                min(start + REBALANCE_BATCH_SIZE, len(rows)) / len(rows)
+            )
+
+        if project_id is not None:
+            await publish(session, context.owner_id, "project.updated", project_id)
+        await session.commit()
+
+    return {"tasks": len(task_ids)}
@@ -1,15 +1,98 @@
-from fastapi import FastAPI
+import asyncio
+import signal
+import threading
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager
 
+from fastapi import Depends, FastAPI
+
+from app import jobs as job_handlers  # noqa: F401, registers the job handlers
+from app.core.archive import run_archiver
+from app.core.compression import CompressionMiddleware
 from app.core.config import config
-from app.deps import SessionDep
-from app.routers import auth, labels, projects, tasks, users
+from app.core.db import dispose_engines, warm_up_pool
+from app.core.deadline import DeadlineMiddleware
+from app.core.events import broadcaster
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.jobs import JobWorker
+from app.core.negotiation import negotiate_media_type
+from app.core.purge import run_purger
+from app.core.ratelimit import RateLimitMiddleware
+from app.core.replica import COMMIT_LSN_HEADER, ReadYourWritesMiddleware
+from app.routers import (
+    auth,
+    batch,
+    events,
+    health,
+    jobs,
+    labels,
+    projects,
+    tasks,
+    users,
+)
+
+
+def on_shutdown_signal(callback: Callable[[], None]) -> None:
+    """Run a callback as soon as the server is asked to shut down, before
+    uvicorn drains the in-flight requests, by chaining its signal handlers.
+
+    uvicorn restores the handlers it replaced once it exits.
+    """
+    # Signals can only be handled in the main thread
+    if threading.current_thread() is not threading.main_thread():
+        return
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        previous = signal.getsignal(sig)
+
+        def handler(signum: int, frame: object, previous: object = previous) -> None:
+            loop.call_soon_threadsafe(callback)
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(sig, handler)
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    # Warm up in the background, so the server starts listening right away
+    warm_up = asyncio.create_task(warm_up_pool(config.db_warm_connections))
+    archiver = asyncio.create_task(run_archiver())
+    purger = asyncio.create_task(run_purger())
+    job_worker = asyncio.create_task(JobWorker(config.job_workers).run())
+    # Event streams never finish on their own, end them when the shutdown
+    # starts rather than once the drain times out
+    on_shutdown_signal(broadcaster.shut_down)
+    yield
+    # On SIGTERM, uvicorn stops accepting connections and waits for the
+    # in-flight requests to finish before the lifespan shuts down
+    warm_up.cancel()
+    archiver.cancel()
+    purger.cancel()
+    # Puts the running jobs back in the queue before the pool closes
+    job_worker.cancel()
+    await asyncio.gather(job_worker, return_exceptions=True)
+    await broadcaster.close()
+    await dispose_engines()
+
 
 app = FastAPI(
+    lifespan=lifespan,
     title="Task Management API",
     description="API for managing tasks with FastAPI, SQLAlchemy, and Pydantic.",
     version="0.1.0",
+    dependencies=[Depends(negotiate_media_type)],
 )
 
+app.add_middleware(ReadYourWritesMiddleware)  # ty:ignore[invalid-argument-type]
+app.add_middleware(IdempotencyMiddleware)  # ty:ignore[invalid-argument-type]
+app.add_middleware(RateLimitMiddleware)  # ty:ignore[invalid-argument-type]
+app.add_middleware(DeadlineMiddleware)  # ty:ignore[invalid-argument-type]
+# Outside the idempotency middleware, so replays are compressed for the client
+# asking again
+app.add_middleware(CompressionMiddleware)  # ty:ignore[invalid-argument-type]
+
 # Set all CORS enabled origins
 if config.all_cors_origins:
     from fastapi.middleware.cors import CORSMiddleware
@@ -20,6 +103,7 @@ if config.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[COMMIT_LSN_HEADER],
     )
 
 
@@ -28,8 +112,7 @@ app.include_router(users.router)
 app.include_router(projects.router)
 app.include_router(tasks.router)
 app.include_router(labels.router)
-
-
-@app.get("/health", tags=["status"])
-async def read_health(*, _session: SessionDep) -> dict:
-    return {"status": "ok"}
+app.include_router(batch.router)
+app.include_router(events.router)
+app.include_router(jobs.router)
+app.include_router(health.router)
@@ -2,9 +2,19 @@ from __future__ import annotations
 
 import re
 from datetime import UTC, datetime
-from typing import Annotated
+from typing import Annotated, Literal
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
-from pydantic import AfterValidator, BaseModel, ConfigDict, EmailStr, Field
+from pydantic import (
+    AfterValidator,
+    BaseModel,
+    ConfigDict,
+    EmailStr,
+    Field,
+    JsonValue,
+    field_serializer,
+    model_validator,
+)
 
 
 def check_hex_color(color: str | None) -> str | None:
@@ -29,6 +39,23 @@ def check_due_date_is_future(due_date: datetime) -> datetime:
 DueDate = Annotated[datetime, AfterValidator(check_due_date_is_future)]
 
 
+def check_timezone(timezone: str) -> str:
+    try:
+        ZoneInfo(timezone)
+    except ZoneInfoNotFoundError:
+        raise ValueError(
+            "timezone must be an IANA time zone (e.g., Europe/Prague)"
+        ) from None
+    return timezone
+
+
+TimeZone = Annotated[
+    str,
+    Field(max_length=64, examples=["Europe/Prague"]),
+    AfterValidator(check_timezone),
+]
+
+
 class Paged[SchemaType](BaseModel):
     model_config = ConfigDict(from_attributes=True, arbitrary_types_allowed=True)
 
@@ -38,6 +65,26 @@ class Paged[SchemaType](BaseModel):
     results: list[SchemaType]
 
 
+class Batch[SchemaType](BaseModel):
+    model_config = ConfigDict(from_attributes=True, arbitrary_types_allowed=True)
+
+    results: list[SchemaType]
+    missing: list[int]
+
+
+class CursorPaged[SchemaType](BaseModel):
+    model_config = ConfigDict(from_attributes=True, arbitrary_types_allowed=True)
+
+    per_page: int
+    next_cursor: str | None
+    results: list[SchemaType]
+
+
+class CursorPaginationParams(BaseModel):
+    cursor: str | None = None
+    per_page: Annotated[int, Field(ge=1, le=100)] = 10
+
+
 class PaginationParams(BaseModel):
     page: Annotated[int, Field(ge=1)] = 1
     per_page: Annotated[int, Field(ge=1, le=100)] = 10
@@ -51,6 +98,59 @@ class PaginationParams(BaseModel):
         return self.per_page
 
 
+class TaskExpandParams(BaseModel):
+    expand: Annotated[
+        str | None,
+        Field(
+            pattern=r"^(project|labels)(,(project|labels))*$",
+            examples=["project,labels"],
+        ),
+    ] = None
+
+    @property
+    def project(self) -> bool:
+        return self.expand is not None and "project" in self.expand.split(",")
+
+    @property
+    def labels(self) -> bool:
+        return self.expand is not None and "labels" in self.expand.split(",")
+
+    @property
+    def response_schema(self) -> type[TaskPublic]:
+        if self.project and self.labels:
+            return TaskPublicWithProjectLabels
+        if self.project:
+            return TaskPublicWithProject
+        if self.labels:
+            return TaskPublicWithLabels
+        return TaskPublic
+
+
+class FieldsParams(BaseModel):
+    fields: Annotated[
+        str | None,
+        Field(pattern=r"^\w+(,\w+)*$", examples=["id,title,completed"]),
+    ] = None
+
+
+class UsageParams(BaseModel):
+    include: Annotated[Literal["counts"] | None, Field(examples=["counts"])] = None
+    sort: Annotated[Literal["usage"] | None, Field(examples=["usage"])] = None
+
+    @property
+    def counts(self) -> bool:
+        return self.include == "counts"
+
+    @property
+    def by_usage(self) -> bool:
+        return self.sort == "usage"
+
+
+class TaskCounts(BaseModel):
+    open: int
+    total: int
+
+
 class UserBase(BaseModel):
     username: str
     email: EmailStr
@@ -58,12 +158,18 @@ class UserBase(BaseModel):
 
 class UserCreate(UserBase):
     password: str
+    timezone: TimeZone = "UTC"
+
+
+class UserUpdate(BaseModel):
+    timezone: TimeZone | None = None
 
 
 class UserPublic(UserBase):
     model_config = ConfigDict(from_attributes=True)
 
     id: int
+    timezone: str
 
 
 class Token(BaseModel):
@@ -92,16 +198,58 @@ class ProjectPublic(BaseModel):
     created_at: datetime
 
 
+class ProjectPublicWithCounts(ProjectPublic):
+    task_counts: TaskCounts
+
+
+class Recurrence(BaseModel):
+    """Repeat a task every `interval` days, weeks or months from its due date.
+
+    Weekly tasks repeat on the ISO `weekdays` (1 is Monday), by default the
+    weekday of the due date. Occurrences follow the due date's local time in
+    the owner's time zone.
+    """
+
+    frequency: Literal["daily", "weekly", "monthly"]
+    interval: Annotated[int, Field(ge=1, le=365)] = 1
+    weekdays: Annotated[
+        list[Annotated[int, Field(ge=1, le=7)]] | None,
+        Field(min_length=1, max_length=7),
+    ] = None
+    until: datetime | None = None
+
+    @model_validator(mode="after")
+    def check_weekdays_are_weekly(self) -> Recurrence:
+        if self.weekdays is not None and self.frequency != "weekly":
+            raise ValueError("weekdays are only allowed on weekly recurrence")
+        return self
+
+
 class TaskBase(BaseModel):
     description: Annotated[str | None, Field(max_length=500)] = None
     due_date: DueDate | None = None
     project_id: int | None = None
+    recurrence: Recurrence | None = None
+
+    @field_serializer("recurrence")
+    def serialize_recurrence(self, recurrence: Recurrence | None) -> dict | None:
+        # Stored as JSONB
+        if recurrence is None:
+            return None
+        return recurrence.model_dump(mode="json", exclude_none=True)
 
 
 class TaskCreate(TaskBase):
     title: Annotated[str, Field(min_length=1, max_length=255)]
     priority: Annotated[int, Field(ge=1, le=5)] = 1
     completed: bool = False
+    parent_id: int | None = None
+
+    @model_validator(mode="after")
+    def check_recurrence_has_due_date(self) -> TaskCreate:
+        if self.recurrence is not None and self.due_date is None:
+            raise ValueError("recurring tasks must have a due date")
+        return self
 
 
 class TaskUpdate(TaskBase):
@@ -118,8 +266,27 @@ class TaskPublic(BaseModel):
     description: str | None
     priority: Annotated[int, Field(ge=1, le=5)]
     completed: bool
-    due_date: DueDate | None
+    completed_at: datetime | None = None
+    due_date: datetime | None
     project_id: int | None
+    parent_id: int | None = None
+    recurrence: Recurrence | None = None
+    rank: str | None = None
+
+
+class TaskMove(BaseModel):
+    parent_id: int | None
+
+
+class TaskReorder(BaseModel):
+    # The task to place it right after, or none to place it first
+    after_id: int | None
+
+
+class TaskSubtree(TaskPublic):
+    # Depth first, each after its parent
+    descendants: list[TaskPublic]
+    task_counts: TaskCounts
 
 
 class TaskPublicWithProject(TaskPublic):
@@ -143,6 +310,10 @@ class LabelCreate(LabelBase):
     pass
 
 
+class LabelUpsert(BaseModel):
+    color: HexColor | None = None
+
+
 class LabelUpdate(BaseModel):
     name: Annotated[str | None, Field(max_length=50)] = None
     color: HexColor | None = None
@@ -154,5 +325,101 @@ class LabelPublic(LabelBase):
     id: int
 
 
+class LabelPublicWithCounts(LabelPublic):
+    task_counts: TaskCounts
+
+
 class LabelPublicWithTasks(LabelPublic):
     tasks: list[TaskPublic] = []
+
+
+class TaskOccurrenceUpdate(BaseModel):
+    due_date: datetime
+    status: Literal["completed", "skipped"]
+
+
+class TaskOccurrencePublic(TaskOccurrenceUpdate):
+    model_config = ConfigDict(from_attributes=True)
+
+    task_id: int
+
+
+class AgendaBucket(BaseModel):
+    total: int
+    results: list[TaskPublic]
+
+
+class Agenda(BaseModel):
+    timezone: str
+    overdue: AgendaBucket
+    today: AgendaBucket
+    tomorrow: AgendaBucket
+    this_week: AgendaBucket
+
+
+class JobPublic(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    kind: str
+    status: Literal["queued", "running", "succeeded", "failed"]
+    progress: Annotated[float, Field(ge=0, le=1)]
+    attempts: int
+    result: dict | None
+    error: str | None
+    created_at: datetime
+    finished_at: datetime | None
+
+
+class BatchOperation(BaseModel):
+    method: Literal["POST", "PATCH", "PUT", "DELETE"]
+    path: Annotated[str, Field(examples=["/tasks/$task/complete"])]
+    body: JsonValue = None
+    # Names the id the operation returns, for later operations to use as
+    # "$name" in their path or {"$ref": "name"} in their body
+    ref: Annotated[str | None, Field(pattern=r"^\w+$")] = None
+
+
+class BatchOperations(BaseModel):
+    mode: Literal["all_or_nothing", "best_effort"] = "all_or_nothing"
+    operations: Annotated[list[BatchOperation], Field(min_length=1, max_length=100)]
+
+
+class BatchOperationResult(BaseModel):
+    # The status and body the operation would have had as a request of its own
+    status: int
+    body: JsonValue = None
+
+
+class BatchOperationResults(BaseModel):
+    committed: bool
+    results: list[BatchOperationResult]
+
+
+PagedTaskExpanded = (
+    Paged[TaskPublic]
+    | Paged[TaskPublicWithProject]
+    | Paged[TaskPublicWithLabels]
+    | Paged[TaskPublicWithProjectLabels]
+)
+
+
+CursorPagedTaskExpanded = (
+    CursorPaged[TaskPublic]
+    | CursorPaged[TaskPublicWithProject]
+    | CursorPaged[TaskPublicWithLabels]
+    | CursorPaged[TaskPublicWithProjectLabels]
+)
+
+
+# Tried in order, so that the counts are kept when there are any
+PagedProjectWithCounts = Annotated[
+    Paged[ProjectPublicWithCounts] | Paged[ProjectPublic],
+    Field(union_mode="left_to_right"),
+]
+
+
+PagedLabelWithCounts = Annotated[
+    Paged[LabelPublicWithCounts] | Paged[LabelPublic],
+    Field(union_mode="left_to_right"),
+]
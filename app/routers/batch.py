@@ -0,0 +1,229 @@
+import inspect
+import logging
+from dataclasses import dataclass
+from typing import get_type_hints
+
+from fastapi import APIRouter, HTTPException, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, JsonValue, TypeAdapter, ValidationError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.routing import Match
+
+from app.deps import CurrentUserDep, SessionDep
+from app.models import (
+    BatchOperation,
+    BatchOperationResult,
+    BatchOperationResults,
+    BatchOperations,
+)
+from app.routers import labels, projects, tasks
+from app.schema import User
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/batch", tags=["batch"])
+
+
+@dataclass
+class BatchRoute:
+    route: APIRoute
+    path_params: dict[str, TypeAdapter]
+    body: tuple[str, TypeAdapter] | None
+    response: TypeAdapter | None
+
+
+def batch_route(route: APIRoute) -> BatchRoute | None:
+    """Return how to call a route's handler from a batch, if it only takes the
+    session, the current user, path parameters and a body."""
+    hints = get_type_hints(route.endpoint, include_extras=True)
+
+    path_params = {}
+    body = None
+    for name in inspect.signature(route.endpoint).parameters:
+        if name in ("session", "current_user"):
+            continue
+        hint = hints[name]
+        if name in route.param_convertors:
+            path_params[name] = TypeAdapter(hint)
+        elif body is None and isinstance(hint, type) and issubclass(hint, BaseModel):
+            body = (name, TypeAdapter(hint))
+        else:
+            return None
+
+    response = TypeAdapter(route.response_model) if route.response_model else None
+    return BatchRoute(route, path_params, body, response)
+
+
+# The project, task and label routes that change something
+batch_routes = [
+    found
+    for module in (projects, tasks, labels)
+    for route in module.router.routes
+    if isinstance(route, APIRoute)
+    and (route.methods or set()) & {"POST", "PATCH", "PUT", "DELETE"}
+    and (found := batch_route(route)) is not None
+]
+
+
+def resolve_path(path: str, refs: dict[str, int]) -> str:
+    segments = path.split("/")
+    for index, segment in enumerate(segments):
+        if segment.startswith("$"):
+            if segment[1:] not in refs:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown reference {segment}",
+                )
+            segments[index] = str(refs[segment[1:]])
+    return "/".join(segments)
+
+
+def resolve_body(value: JsonValue, refs: dict[str, int]) -> JsonValue:
+    if isinstance(value, dict):
+        if value.keys() == {"$ref"}:
+            ref = value["$ref"]
+            if not isinstance(ref, str) or ref not in refs:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Unknown reference {ref}",
+                )
+            return refs[ref]
+        return {key: resolve_body(item, refs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_body(item, refs) for item in value]
+    return value
+
+
+def validation_error(error: ValidationError, *loc: str) -> HTTPException:
+    """Report invalid input like FastAPI does for a request."""
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_CONTENT,
+        detail=[
+            {**detail, "loc": [*loc, *detail["loc"]]}
+            for detail in jsonable_encoder(error.errors(include_url=False))
+        ],
+    )
+
+
+async def run_operation(
+    session: AsyncSession,
+    current_user: User,
+    operation: BatchOperation,
+    refs: dict[str, int],
+) -> BatchOperationResult:
+    """Run an operation with the handler of the route it names, as a request
+    to that route would."""
+    scope = {
+        "type": "http",
+        "method": operation.method,
+        "path": resolve_path(operation.path, refs),
+    }
+    for candidate in batch_routes:
+        match, child_scope = candidate.route.matches(scope)
+        if match == Match.FULL:
+            break
+    else:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+
+    arguments: dict[str, object] = {"session": session, "current_user": current_user}
+    for name, adapter in candidate.path_params.items():
+        try:
+            arguments[name] = adapter.validate_python(child_scope["path_params"][name])
+        except ValidationError as error:
+            raise validation_error(error, "path", name) from error
+    if candidate.body is not None:
+        name, adapter = candidate.body
+        try:
+            arguments[name] = adapter.validate_python(
+                resolve_body(operation.body, refs)
+            )
+        except ValidationError as error:
+            raise validation_error(error, "body") from error
+
+    result = await candidate.route.endpoint(**arguments)
+
+    status_code = candidate.route.status_code or status.HTTP_200_OK
+    if candidate.response is None:
+        return BatchOperationResult(status=status_code)
+    return BatchOperationResult(
+        status=status_code,
+        body=candidate.response.dump_python(
+            candidate.response.validate_python(result, from_attributes=True),
+            mode="json",
+        ),
+    )
+
+
+@router.post("", response_model=BatchOperationResults)
+async def run_batch(
+    *,
+    session: SessionDep,
+    current_user: CurrentUserDep,
+    batch: BatchOperations,
+) -> BatchOperationResults:
+    """Run operations on projects, tasks and labels, each written like a
+    request to their routes, in order and in one transaction.
+
+    With `all_or_nothing`, the first operation to fail rolls back the whole
+    batch, and the ones after it are not run. With `best_effort`, only the
+    failed operations are rolled back.
+    """
+    # Every operation commits a savepoint of the request's transaction, which
+    # is committed once at the end
+    connection = await session.connection()
+    operation_session = AsyncSession(
+        bind=connection,
+        join_transaction_mode="create_savepoint",
+        expire_on_commit=False,
+    )
+
+    refs: dict[str, int] = {}
+    results: list[BatchOperationResult] = []
+    committed = True
+    async with operation_session:
+        for operation in batch.operations:
+            try:
+                result = await run_operation(
+                    operation_session, current_user, operation, refs
+                )
+            except HTTPException as error:
+                await operation_session.rollback()
+                result = BatchOperationResult(
+                    status=error.status_code, body={"detail": error.detail}
+                )
+            except IntegrityError:
+                await operation_session.rollback()
+                result = BatchOperationResult(
+                    status=status.HTTP_409_CONFLICT,
+                    body={"detail": "Conflicts with existing data"},
+                )
+            except SQLAlchemyError, ValueError:
+                logger.exception(
+                    "Batch operation %s %s failed", operation.method, operation.path
+                )
+                await operation_session.rollback()
+                result = BatchOperationResult(
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    body={"detail": "Internal Server Error"},
+                )
+
+            results.append(result)
+            if result.status >= status.HTTP_400_BAD_REQUEST:
+                if batch.mode == "all_or_nothing":
+                    committed = False
+                    break
+            elif (
+                operation.ref is not None
+                and isinstance(result.body, dict)
+                and isinstance(result.body.get("id"), int)
+            ):
+                refs[operation.ref] = result.body["id"]
+
+    if committed:
+        await session.commit()
+    else:
+        await session.rollback()
+
+    return BatchOperationResults(committed=committed, results=results)
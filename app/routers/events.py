@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from app.core.deadline import RequestTimeout
+from app.core.events import stream_events
+from app.deps import CurrentUserDep, ReadSessionDep, SessionDep
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+@router.get(
+    "",
+    response_class=StreamingResponse,
+    dependencies=[Depends(RequestTimeout(None))],
+)
+async def read_events(
+    *,
+    session: SessionDep,
+    read_session: ReadSessionDep,
+    current_user: CurrentUserDep,
+) -> StreamingResponse:
+    # The stream outlives the sessions used to authenticate, give their
+    # connections back to the pool before it starts
+    await read_session.close()
+    await session.close()
+
+    return StreamingResponse(
+        stream_events(current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
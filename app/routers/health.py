@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import JSONResponse
+
+from app.core.db import pool_ready
+from app.core.health import readiness_check
+
+router = APIRouter(prefix="/health", tags=["status"])
+
+
+@router.get("/live")
+async def read_liveness() -> dict:
+    return {"status": "ok"}
+
+
+@router.get("/ready")
+async def read_readiness() -> JSONResponse:
+    ready, content = await readiness_check()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK
+        if ready
+        else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=content,
+    )
+
+
+@router.get("/pool")
+async def read_pool_health() -> dict:
+    if not pool_ready.is_set():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Connection pool is warming up",
+        )
+    return {"status": "ok"}
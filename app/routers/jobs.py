@@ -0,0 +1,24 @@
+from fastapi import APIRouter, HTTPException, status
+
+from app.deps import CurrentUserDep, SessionDep
+from app.models import JobPublic
+from app.schema import Job
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}", response_model=JobPublic)
+async def read_job(
+    *,
+    session: SessionDep,
+    current_user: CurrentUserDep,
+    job_id: int,
+) -> Job:
+    # Read from the primary, as progress moves faster than replication
+    job = await session.get(Job, job_id)
+    if not job or job.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Job not found"
+        )
+
+    return job
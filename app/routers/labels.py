@@ -1,9 +1,40 @@
-from fastapi import APIRouter, HTTPException, status
-from sqlalchemy import func, select
+from typing import Annotated
 
-from app.deps import CurrentUserDep, PaginationParamsDep, SessionDep
-from app.models import LabelCreate, LabelPublic, LabelUpdate, Paged, TaskPublic
-from app.schema import Label, Task
+from fastapi import APIRouter, HTTPException, Path, Query, Response, status
+from sqlalchemy import ARRAY, Integer, any_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.core.events import publish
+from app.core.fields import (
+    load_columns,
+    requested_fields,
+    sparse_page,
+    sparse_response,
+)
+from app.core.negotiation import NegotiatedResponse
+from app.deps import (
+    CurrentUserDep,
+    FieldsParamsDep,
+    PaginationParamsDep,
+    ReadSessionDep,
+    SessionDep,
+    TaskExpandParamsDep,
+    UsageParamsDep,
+)
+from app.models import (
+    Batch,
+    LabelCreate,
+    LabelPublic,
+    LabelPublicWithCounts,
+    LabelUpdate,
+    LabelUpsert,
+    Paged,
+    PagedLabelWithCounts,
+    PagedTaskExpanded,
+    TaskCounts,
+)
+from app.schema import ArchivedTask, ArchivedTaskLabel, Label, Task, TaskLabel
 
 router = APIRouter(prefix="/labels", tags=["labels"])
 
@@ -15,51 +46,177 @@ async def create_label(
     current_user: CurrentUserDep,
     label: LabelCreate,
 ) -> Label:
-    existing_label = await session.scalar(select(Label).where(Label.name == label.name))
-    if existing_label:
+    db_label = await session.scalar(
+        insert(Label)
+        .values(**label.model_dump(), owner_id=current_user.id)
+        .on_conflict_do_nothing(constraint="uq_label_name_owner")
+        .returning(Label)
+    )
+    if not db_label:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Label already exists"
         )
 
-    db_label = Label(**label.model_dump(), owner_id=current_user.id)
+    await publish(session, current_user.id, "label.created", db_label.id)
+    await session.commit()
+
+    return db_label
+
 
-    session.add(db_label)
+@router.put("/by-name/{name}", response_model=LabelPublic)
+async def upsert_label(
+    *,
+    session: SessionDep,
+    current_user: CurrentUserDep,
+    name: Annotated[str, Path(min_length=1, max_length=50)],
+    label: LabelUpsert,
+) -> Label:
+    stmt = insert(Label).values(
+        **label.model_dump(), name=name, owner_id=current_user.id
+    )
+    db_label = (
+        await session.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_label_name_owner", set_={"color": stmt.excluded.color}
+            ).returning(Label)
+        )
+    ).scalar_one()
+    await publish(session, current_user.id, "label.updated", db_label.id)
 
     await session.commit()
-    await session.refresh(db_label)
 
     return db_label
 
 
-@router.get("", response_model=Paged[LabelPublic])
+@router.get(
+    "",
+    response_model=PagedLabelWithCounts,
+    response_class=NegotiatedResponse,
+)
 async def read_labels(
     *,
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: CurrentUserDep,
     paging: PaginationParamsDep,
+    usage: UsageParamsDep,
+    sparse: FieldsParamsDep,
     # TODO: add filter query `q`, to fetch labels where name contains `q`
-) -> Paged[Label]:
+) -> Paged[Label] | Paged[LabelPublicWithCounts] | Response:
+    """Return the user's labels, with `include=counts` adding the number of
+    open and all tasks of each, and `sort=usage` putting the most used
+    first."""
+    schema = LabelPublicWithCounts if usage.counts else LabelPublic
+    fields = requested_fields(sparse, schema)
+
     query = select(Label).where(Label.owner_id == current_user.id)
 
     total = await session.execute(select(func.count()).select_from(query.subquery()))
-    labels = await session.scalars(query.offset(paging.offset).limit(paging.limit))
 
-    return Paged(
+    if not usage.counts and not usage.by_usage:
+        if fields:
+            query = query.options(load_columns(Label, fields))
+        labels = await session.scalars(query.offset(paging.offset).limit(paging.limit))
+
+        page = sparse_page(Paged, schema, fields)(
+            page=paging.page,
+            per_page=paging.per_page,
+            total=total.scalar_one(),
+            results=labels.all(),
+        )
+
+        return sparse_response(page) if fields else page
+
+    # Counted in the same query, with one grouped join over the owner's
+    # task_labels partition. Archived tasks are all completed, so they only add
+    # to the total.
+    archived = (
+        select(ArchivedTaskLabel.label_id, func.count().label("count"))
+        .join(
+            ArchivedTask,
+            (ArchivedTask.id == ArchivedTaskLabel.task_id)
+            & (ArchivedTask.owner_id == ArchivedTaskLabel.owner_id),
+        )
+        .where(ArchivedTaskLabel.owner_id == current_user.id)
+        .group_by(ArchivedTaskLabel.label_id)
+        .subquery()
+    )
+    open_tasks = func.count(Task.id).filter(~Task.completed)
+    all_tasks = func.count(Task.id) + func.coalesce(func.max(archived.c.count), 0)
+    query = (
+        query.add_columns(open_tasks, all_tasks)
+        .outerjoin(
+            TaskLabel,
+            (TaskLabel.label_id == Label.id) & (TaskLabel.owner_id == current_user.id),
+        )
+        .outerjoin(
+            Task,
+            (Task.id == TaskLabel.task_id) & (Task.owner_id == TaskLabel.owner_id),
+        )
+        .outerjoin(archived, archived.c.label_id == Label.id)
+        .group_by(Label.id)
+    )
+    if usage.by_usage:
+        query = query.order_by(all_tasks.desc(), Label.id)
+    rows = await session.execute(query.offset(paging.offset).limit(paging.limit))
+
+    page = sparse_page(Paged, schema, fields)(
         page=paging.page,
         per_page=paging.per_page,
         total=total.scalar_one(),
-        results=labels.all(),
+        results=[
+            LabelPublicWithCounts(
+                **LabelPublic.model_validate(label).model_dump(),
+                task_counts=TaskCounts(open=open_count, total=total_count),
+            )
+            if usage.counts
+            else label
+            for label, open_count, total_count in rows
+        ],
+    )
+
+    return sparse_response(page) if fields else page
+
+
+@router.get(
+    "/batch", response_model=Batch[LabelPublic], response_class=NegotiatedResponse
+)
+async def read_labels_batch(
+    *,
+    session: ReadSessionDep,
+    current_user: CurrentUserDep,
+    ids: Annotated[list[int], Query(min_length=1, max_length=100)],
+) -> Batch[Label]:
+    labels = await session.scalars(
+        select(Label)
+        .where(Label.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))
+        .where(Label.owner_id == current_user.id)
     )
+    results = labels.all()
+
+    found_ids = {label.id for label in results}
 
+    return Batch(
+        results=results,
+        missing=[id for id in dict.fromkeys(ids) if id not in found_ids],
+    )
 
-@router.get("/{label_id}/tasks", response_model=Paged[TaskPublic])
+
+@router.get(
+    "/{label_id}/tasks",
+    response_model=PagedTaskExpanded,
+    response_class=NegotiatedResponse,
+)
 async def read_label_tasks(
     *,
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: CurrentUserDep,
     label_id: int,
     paging: PaginationParamsDep,
-) -> Paged[Task]:
+    expand: TaskExpandParamsDep,
+    sparse: FieldsParamsDep,
+) -> PagedTaskExpanded | Response:
+    fields = requested_fields(sparse, expand.response_schema)
+
     label = await session.get(Label, label_id)
     if not label or label.owner_id != current_user.id:
         raise HTTPException(
@@ -67,18 +224,35 @@ async def read_label_tasks(
             detail="Project not found",
         )
 
-    query = select(Task).where(Task.labels.any(Label.id == label_id))
+    query = (
+        select(Task)
+        .join(
+            TaskLabel,
+            (TaskLabel.task_id == Task.id) & (TaskLabel.owner_id == Task.owner_id),
+        )
+        .where(Task.owner_id == current_user.id)
+        .where(TaskLabel.label_id == label_id)
+    )
 
     total = await session.execute(select(func.count()).select_from(query.subquery()))
+
+    if expand.project:
+        query = query.options(joinedload(Task.project))
+    if expand.labels:
+        query = query.options(selectinload(Task.labels))
+    if fields:
+        query = query.options(load_columns(Task, fields))
     tasks = await session.scalars(query.offset(paging.offset).limit(paging.limit))
 
-    return Paged(
+    page = sparse_page(Paged, expand.response_schema, fields)(
         page=paging.page,
         per_page=paging.per_page,
         total=total.scalar_one(),
         results=tasks.all(),
     )
 
+    return sparse_response(page) if fields else page
+
 
 @router.patch("/{label_id}", response_model=LabelPublic)
 async def update_label(
@@ -98,6 +272,7 @@ async def update_label(
     for field, value in update_data.items():
         setattr(db_label, field, value)
 
+    await publish(session, current_user.id, "label.updated", label_id)
     await session.commit()
     await session.refresh(db_label)
 
@@ -118,4 +293,5 @@ async def delete_label(
         )
 
     await session.delete(label)
+    await publish(session, current_user.id, "label.deleted", label_id)
     await session.commit()
@@ -1,15 +1,53 @@
-from fastapi import APIRouter, HTTPException, status
-from sqlalchemy import func, select
+from typing import Annotated
 
-from app.deps import CurrentUserDep, PaginationParamsDep, SessionDep
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from sqlalchemy import (
+    ARRAY,
+    Integer,
+    any_,
+    bindparam,
+    func,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.orm import joinedload, selectinload
+
+from app.core.events import publish
+from app.core.fields import (
+    load_columns,
+    requested_fields,
+    sparse_page,
+    sparse_response,
+    sparse_schema,
+)
+from app.core.jobs import enqueue
+from app.core.negotiation import NegotiatedResponse
+from app.core.ranking import decode_cursor, encode_cursor
+from app.deps import (
+    CurrentUserDep,
+    CursorPaginationParamsDep,
+    FieldsParamsDep,
+    PaginationParamsDep,
+    ReadSessionDep,
+    SessionDep,
+    TaskExpandParamsDep,
+    UsageParamsDep,
+)
 from app.models import (
+    Batch,
+    CursorPaged,
+    CursorPagedTaskExpanded,
+    JobPublic,
     Paged,
+    PagedProjectWithCounts,
     ProjectCreate,
     ProjectPublic,
+    ProjectPublicWithCounts,
     ProjectUpdate,
-    TaskPublic,
+    TaskCounts,
 )
-from app.schema import Project, Task
+from app.schema import ArchivedTask, Job, Project, Task
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
@@ -25,57 +63,194 @@ async def create_project(
 
     session.add(db_project)
 
+    await session.flush()
+    await publish(session, current_user.id, "project.created", db_project.id)
     await session.commit()
     await session.refresh(db_project)
 
     return db_project
 
 
-@router.get("", response_model=Paged[ProjectPublic])
-async def read_projects(
+@router.post(
+    "/{project_id}/duplicate",
+    status_code=status.HTTP_202_ACCEPTED,
+    response_model=JobPublic,
+)
+async def create_duplicate_project(
     *,
     session: SessionDep,
     current_user: CurrentUserDep,
+    project_id: int,
+) -> Job:
+    """Queue a copy of the project with its tasks. The new project's id is in
+    the result of the job, polled with `GET /jobs/{job_id}`."""
+    project = await session.get(Project, project_id)
+    if not project or project.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Project not found"
+        )
+
+    job = await enqueue(
+        session, current_user.id, "project.duplicate", {"project_id": project_id}
+    )
+
+    await session.commit()
+    await session.refresh(job)
+
+    return job
+
+
+@router.get(
+    "",
+    response_model=PagedProjectWithCounts,
+    response_class=NegotiatedResponse,
+)
+async def read_projects(
+    *,
+    session: ReadSessionDep,
+    current_user: CurrentUserDep,
     paging: PaginationParamsDep,
-) -> Paged[Project]:
+    usage: UsageParamsDep,
+    sparse: FieldsParamsDep,
+) -> Paged[Project] | Paged[ProjectPublicWithCounts] | Response:
+    """Return the user's projects, with `include=counts` adding the number of
+    open and all tasks of each, and `sort=usage` putting the largest first."""
+    schema = ProjectPublicWithCounts if usage.counts else ProjectPublic
+    fields = requested_fields(sparse, schema)
+
     query = select(Project).where(Project.owner_id == current_user.id)
 
     total = await session.execute(select(func.count()).select_from(query.subquery()))
-    projects = await session.scalars(query.offset(paging.offset).limit(paging.limit))
 
-    return Paged(
+    if not usage.counts and not usage.by_usage:
+        if fields:
+            query = query.options(load_columns(Project, fields))
+        projects = await session.scalars(
+            query.offset(paging.offset).limit(paging.limit)
+        )
+
+        page = sparse_page(Paged, schema, fields)(
+            page=paging.page,
+            per_page=paging.per_page,
+            total=total.scalar_one(),
+            results=projects.all(),
+        )
+
+        return sparse_response(page) if fields else page
+
+    # Counted in the same query, with one grouped join over the owner's tasks
+    # partition. Archived tasks are all completed, so they only add to the
+    # total.
+    archived = (
+        select(ArchivedTask.project_id, func.count().label("count"))
+        .where(ArchivedTask.owner_id == current_user.id)
+        .group_by(ArchivedTask.project_id)
+        .subquery()
+    )
+    open_tasks = func.count(Task.id).filter(~Task.completed)
+    all_tasks = func.count(Task.id) + func.coalesce(func.max(archived.c.count), 0)
+    query = (
+        query.add_columns(open_tasks, all_tasks)
+        .outerjoin(
+            Task,
+            (Task.project_id == Project.id) & (Task.owner_id == current_user.id),
+        )
+        .outerjoin(archived, archived.c.project_id == Project.id)
+        .group_by(Project.id)
+    )
+    if usage.by_usage:
+        query = query.order_by(all_tasks.desc(), Project.id)
+    rows = await session.execute(query.offset(paging.offset).limit(paging.limit))
+
+    page = sparse_page(Paged, schema, fields)(
         page=paging.page,
         per_page=paging.per_page,
         total=total.scalar_one(),
-        results=projects.all(),
+        results=[
+            ProjectPublicWithCounts(
+                **ProjectPublic.model_validate(project).model_dump(),
+                task_counts=TaskCounts(open=open_count, total=total_count),
+            )
+            if usage.counts
+            else project
+            for project, open_count, total_count in rows
+        ],
+    )
+
+    return sparse_response(page) if fields else page
+
+
+@router.get(
+    "/batch", response_model=Batch[ProjectPublic], response_class=NegotiatedResponse
+)
+async def read_projects_batch(
+    *,
+    session: ReadSessionDep,
+    current_user: CurrentUserDep,
+    ids: Annotated[list[int], Query(min_length=1, max_length=100)],
+) -> Batch[Project]:
+    projects = await session.scalars(
+        select(Project)
+        .where(Project.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))
+        .where(Project.owner_id == current_user.id)
+    )
+    results = projects.all()
+
+    found_ids = {project.id for project in results}
+
+    return Batch(
+        results=results,
+        missing=[id for id in dict.fromkeys(ids) if id not in found_ids],
     )
 
 
 @router.get("/{project_id}", response_model=ProjectPublic)
 async def read_project(
     *,
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: CurrentUserDep,
     project_id: int,
-) -> Project:
-    project = await session.get(Project, project_id)
+    sparse: FieldsParamsDep,
+) -> Project | Response:
+    fields = requested_fields(sparse, ProjectPublic)
+
+    project = await session.get(
+        Project,
+        project_id,
+        options=[load_columns(Project, fields, "owner_id")] if fields else None,
+    )
     if not project or project.owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Project not found",
         )
 
+    if fields:
+        return sparse_response(
+            sparse_schema(ProjectPublic, fields).model_validate(project)
+        )
     return project
 
 
-@router.get("/{project_id}/tasks", response_model=Paged[TaskPublic])
+@router.get(
+    "/{project_id}/tasks",
+    response_model=CursorPagedTaskExpanded,
+    response_class=NegotiatedResponse,
+)
 async def read_project_tasks(
     *,
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: CurrentUserDep,
     project_id: int,
-    paging: PaginationParamsDep,
-) -> Paged[Task]:
+    paging: CursorPaginationParamsDep,
+    expand: TaskExpandParamsDep,
+    sparse: FieldsParamsDep,
+) -> CursorPagedTaskExpanded | Response:
+    """Return the project's tasks in their manual order, a page at a time,
+    each page picking up right after the previous one through the index on
+    (project_id, rank), however deep into the list."""
+    fields = requested_fields(sparse, expand.response_schema)
+
     project = await session.get(Project, project_id)
     if not project or project.owner_id != current_user.id:
         raise HTTPException(
@@ -83,18 +258,43 @@ async def read_project_tasks(
             detail="Project not found",
         )
 
-    query = select(Task).where(Task.project_id == project_id)
+    query = (
+        select(Task)
+        .where(Task.project_id == project_id)
+        .where(Task.owner_id == current_user.id)
+        .order_by(Task.rank, Task.id)
+    )
+    if paging.cursor is not None:
+        try:
+            after = decode_cursor(paging.cursor)
+        except ValueError as error:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+            ) from error
+        query = query.where(tuple_(Task.rank, Task.id) > after)
 
-    total = await session.execute(select(func.count()).select_from(query.subquery()))
-    tasks = await session.scalars(query.offset(paging.offset).limit(paging.limit))
+    if expand.project:
+        query = query.options(joinedload(Task.project))
+    if expand.labels:
+        query = query.options(selectinload(Task.labels))
+    if fields:
+        # The rank makes the next cursor
+        query = query.options(load_columns(Task, fields, "rank"))
+    # One more than asked for tells whether there is a next page
+    tasks = await session.scalars(query.limit(paging.per_page + 1))
+    results = tasks.all()
 
-    return Paged(
-        page=paging.page,
-        per_page=paging.per_page,
-        total=total.scalar_one(),
-        results=tasks.all(),
+    next_cursor = None
+    if len(results) > paging.per_page:
+        results = results[: paging.per_page]
+        next_cursor = encode_cursor(results[-1].rank, results[-1].id)
+
+    page = sparse_page(CursorPaged, expand.response_schema, fields)(
+        per_page=paging.per_page, next_cursor=next_cursor, results=results
     )
 
+    return sparse_response(page) if fields else page
+
 
 @router.patch("/{project_id}", response_model=ProjectPublic)
 async def update_project(
@@ -115,6 +315,7 @@ async def update_project(
     for field, value in update_data.items():
         setattr(db_project, field, value)
 
+    await publish(session, current_user.id, "project.updated", project_id)
     await session.commit()
     await session.refresh(db_project)
 
@@ -135,5 +336,14 @@ async def delete_project(
             detail="Project not found",
         )
 
-    await session.delete(project)
+    # Hidden from now on, with its tasks, and purged in the background
+    project.deleted_at = func.now()
+    for model in (Task, ArchivedTask):
+        await session.execute(
+            update(model)
+            .where(model.owner_id == current_user.id)
+            .where(model.project_id == project_id)
+            .values(deleted_at=func.now())
+        )
+    await publish(session, current_user.id, "project.deleted", project_id)
     await session.commit()
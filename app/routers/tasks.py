@@ -1,25 +1,147 @@
-from datetime import UTC, datetime, time
-from typing import Annotated
+from datetime import UTC, datetime, timedelta
+from typing import Annotated, cast
 
-from fastapi import APIRouter, HTTPException, Query, status
-from sqlalchemy import func, select
+from fastapi import APIRouter, HTTPException, Query, Response, status
+from sqlalchemy import (
+    ARRAY,
+    ColumnElement,
+    CursorResult,
+    DateTime,
+    Integer,
+    any_,
+    bindparam,
+    case,
+    delete,
+    func,
+    literal,
+    select,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
 
-from app.deps import CurrentUserDep, PaginationParamsDep, SessionDep
+from app.core.archive import unarchive_task
+from app.core.config import config
+from app.core.events import publish
+from app.core.fields import (
+    load_columns,
+    requested_fields,
+    sparse_page,
+    sparse_response,
+    sparse_schema,
+)
+from app.core.jobs import enqueue
+from app.core.negotiation import NegotiatedResponse
+from app.core.ranking import rank_between
+from app.core.recurrence import select_due_tasks, select_occurrences
+from app.deps import (
+    CurrentUserDep,
+    FieldsParamsDep,
+    PaginationParamsDep,
+    ReadSessionDep,
+    SessionDep,
+    TaskExpandParamsDep,
+)
 from app.models import (
+    Agenda,
+    AgendaBucket,
+    Batch,
     Paged,
+    PagedTaskExpanded,
+    PaginationParams,
+    TaskCounts,
     TaskCreate,
+    TaskMove,
+    TaskOccurrencePublic,
+    TaskOccurrenceUpdate,
     TaskPublic,
     TaskPublicWithLabels,
     TaskPublicWithProject,
     TaskPublicWithProjectLabels,
+    TaskReorder,
+    TaskSubtree,
     TaskUpdate,
+    TimeZone,
+)
+from app.schema import (
+    ArchivedTask,
+    Job,
+    Label,
+    Project,
+    Task,
+    TaskLabel,
+    TaskOccurrence,
+    User,
 )
-from app.schema import Label, Project, Task
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
 
+def local_day_start(timezone: str, days: int = 0) -> ColumnElement[datetime]:
+    """Start of the day `days` days from today in `timezone`, computed by the
+    database, so it follows daylight saving time changes."""
+    local_today = func.date_trunc("day", func.timezone(timezone, func.now()))
+    return func.timezone(
+        timezone, local_today + timedelta(days=days), type_=DateTime(timezone=True)
+    )
+
+
+async def get_task_for_update(
+    session: AsyncSession, task_id: int, owner_id: int, options: list | None = None
+) -> Task | None:
+    """Load and lock one of the owner's tasks to change it, moving it back from
+    the archive first if it was archived.
+
+    The lock keeps the archiver from moving the task while it changes.
+    """
+    key = (task_id, owner_id)
+    task = await session.get(Task, key, options=options, with_for_update=True)
+    if task is None and await unarchive_task(session, task_id, owner_id):
+        task = await session.get(Task, key, options=options, with_for_update=True)
+
+    return task
+
+
+def in_project(project_id: int | None) -> ColumnElement[bool]:
+    if project_id is None:
+        return Task.project_id.is_(None)
+    return Task.project_id == project_id
+
+
+async def last_rank(
+    session: AsyncSession, owner_id: int, project_id: int | None
+) -> str | None:
+    return await session.scalar(
+        select(func.max(Task.rank))
+        .where(Task.owner_id == owner_id)
+        .where(in_project(project_id))
+    )
+
+
+async def respace_long_rank(
+    session: AsyncSession, owner_id: int, project_id: int | None, rank: str
+) -> None:
+    """Queue respacing the ranks of a project once one gets too long, unless
+    already queued."""
+    if len(rank) <= config.rank_max_length:
+        return
+
+    payload = {"project_id": project_id}
+    if not await session.scalar(
+        select(Job.id)
+        .where(Job.owner_id == owner_id)
+        .where(Job.kind == "tasks.rebalance")
+        .where(Job.status == "queued")
+        .where(Job.payload == payload)
+        .exists()
+        .select()
+    ):
+        await enqueue(session, owner_id, "tasks.rebalance", payload)
+
+
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=TaskPublic)
 async def create_task(
     *,
@@ -35,10 +157,32 @@ async def create_task(
                 detail="Project not found",
             )
 
-    db_task = Task(**task.model_dump(), owner_id=current_user.id)
+    path = []
+    if task.parent_id is not None:
+        parent = await session.get(Task, (task.parent_id, current_user.id))
+        if not parent or parent.owner_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parent task not found",
+            )
+        path = [*parent.path, parent.id]
+
+    db_task = Task(
+        **task.model_dump(),
+        owner_id=current_user.id,
+        path=path,
+        # Last in its project
+        rank=rank_between(
+            await last_rank(session, current_user.id, task.project_id), None
+        ),
+        completed_at=datetime.now(tz=UTC) if task.completed else None,
+    )
 
     session.add(db_task)
 
+    await session.flush()
+    await respace_long_rank(session, current_user.id, task.project_id, db_task.rank)
+    await publish(session, current_user.id, "task.created", db_task.id)
     await session.commit()
     await session.refresh(db_task)
 
@@ -56,10 +200,12 @@ async def create_duplicate_task(
     current_user: CurrentUserDep,
     task_id: int,
 ) -> Task:
-    task = await session.get(
-        Task, task_id, options=[joinedload(Task.project), selectinload(Task.labels)]
-    )
+    task = await session.get(Task, (task_id, current_user.id))
     if not task or task.owner_id != current_user.id:
+        if await session.get(ArchivedTask, (task_id, current_user.id)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Task is completed"
+            )
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Task not found"
         )
@@ -68,73 +214,166 @@ async def create_duplicate_task(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Task is completed"
         )
 
-    db_task = Task(
-        title=f"{task.title} (Copy)",
-        description=task.description,
-        priority=task.priority,
-        completed=task.completed,
-        due_date=task.due_date,
-        owner_id=task.owner_id,
-        project_id=task.project_id,
+    # Placed right after the original, which it would tie with on its rank
+    next_rank = await session.scalar(
+        select(func.min(Task.rank))
+        .where(Task.owner_id == current_user.id)
+        .where(in_project(task.project_id))
+        .where(Task.rank > task.rank)
     )
-    db_task.labels = list(task.labels)
+    rank = rank_between(task.rank, next_rank)
 
-    session.add(db_task)
+    duplicate_id = (
+        await session.execute(
+            insert(Task)
+            .from_select(
+                [
+                    "title",
+                    "description",
+                    "priority",
+                    "completed",
+                    "due_date",
+                    "owner_id",
+                    "project_id",
+                    "recurrence",
+                    "parent_id",
+                    "path",
+                    "rank",
+                ],
+                select(
+                    Task.title + " (Copy)",
+                    Task.description,
+                    Task.priority,
+                    Task.completed,
+                    Task.due_date,
+                    Task.owner_id,
+                    Task.project_id,
+                    Task.recurrence,
+                    Task.parent_id,
+                    Task.path,
+                    literal(rank),
+                )
+                .where(Task.id == task_id)
+                .where(Task.owner_id == current_user.id),
+            )
+            .returning(Task.id)
+        )
+    ).scalar_one()
+    await respace_long_rank(session, current_user.id, task.project_id, rank)
+
+    await session.execute(
+        insert(TaskLabel).from_select(
+            ["task_id", "label_id", "owner_id"],
+            select(literal(duplicate_id), TaskLabel.label_id, TaskLabel.owner_id)
+            .where(TaskLabel.task_id == task_id)
+            .where(TaskLabel.owner_id == current_user.id),
+        )
+    )
+    await publish(session, current_user.id, "task.created", duplicate_id)
 
     await session.commit()
-    await session.refresh(db_task, attribute_names={"project", "labels"})
 
-    return db_task
+    db_task = await session.scalars(
+        select(Task)
+        .where(Task.id == duplicate_id)
+        .where(Task.owner_id == current_user.id)
+        .options(joinedload(Task.project), selectinload(Task.labels))
+    )
+
+    return db_task.one()
 
 
-@router.get("", response_model=Paged[TaskPublic])
+@router.get("", response_model=PagedTaskExpanded, response_class=NegotiatedResponse)
 async def read_tasks(
     *,
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: CurrentUserDep,
     paging: PaginationParamsDep,
+    expand: TaskExpandParamsDep,
+    sparse: FieldsParamsDep,
     completed: Annotated[bool | None, Query()] = None,
     priority: Annotated[int | None, Query(ge=1, le=5)] = None,
-) -> Paged[Task]:
-    query = select(Task).where(Task.owner_id == current_user.id)
-    if completed is not None:
-        query = query.where(Task.completed == completed)
-    if priority is not None:
-        query = query.where(Task.priority == priority)
+) -> PagedTaskExpanded | Response:
+    """Return the user's tasks by id, including the archived ones unless only
+    open tasks are asked for."""
+    fields = requested_fields(sparse, expand.response_schema)
 
-    total = await session.execute(select(func.count()).select_from(query.subquery()))
-    tasks = await session.scalars(query.offset(paging.offset).limit(paging.limit))
+    models = [Task] if completed is False else [Task, ArchivedTask]
 
-    return Paged(
+    queries = []
+    for model in models:
+        query = select(model.id, literal(model is ArchivedTask).label("archived"))
+        query = query.where(model.owner_id == current_user.id)
+        if completed is not None:
+            query = query.where(model.completed == completed)
+        if priority is not None:
+            query = query.where(model.priority == priority)
+        queries.append(query)
+    keys = union_all(*queries).subquery()
+
+    total = await session.execute(select(func.count()).select_from(keys))
+    page = await session.execute(
+        select(keys.c.id, keys.c.archived)
+        .order_by(keys.c.id)
+        .offset(paging.offset)
+        .limit(paging.limit)
+    )
+    page_keys = page.all()
+
+    loaded: dict[tuple[int, bool], Task | ArchivedTask] = {}
+    for model in models:
+        archived = model is ArchivedTask
+        ids = [id for id, is_archived in page_keys if is_archived == archived]
+        if not ids:
+            continue
+
+        query = (
+            select(model)
+            .where(model.owner_id == current_user.id)
+            .where(model.id.in_(ids))
+        )
+        if expand.project:
+            query = query.options(joinedload(model.project))
+        if expand.labels:
+            query = query.options(selectinload(model.labels))
+        if fields:
+            query = query.options(load_columns(model, fields))
+        tasks = await session.scalars(query)
+        loaded.update(((task.id, archived), task) for task in tasks.unique())
+
+    page = sparse_page(Paged, expand.response_schema, fields)(
         page=paging.page,
         per_page=paging.per_page,
         total=total.scalar_one(),
-        results=tasks.all(),
+        results=[loaded[key] for key in map(tuple, page_keys)],
     )
 
+    return sparse_response(page) if fields else page
 
-@router.get("/upcomming", response_model=Paged[TaskPublic])
-async def read_upcomming_tasks(
-    *,
-    session: SessionDep,
-    current_user: CurrentUserDep,
-    paging: PaginationParamsDep,
-    priority: Annotated[int | None, Query(ge=1, le=5)] = None,
-) -> Paged[Task]:
-    now = datetime.now(tz=UTC)
 
+async def read_due_tasks(
+    session: AsyncSession,
+    current_user: User,
+    paging: PaginationParams,
+    priority: int | None,
+    timezone: str,
+    start: ColumnElement[datetime] | None = None,
+    end: ColumnElement[datetime] | None = None,
+) -> Paged[TaskPublic]:
+    due_tasks = select_due_tasks(current_user.id, timezone, start, end)
+
+    # Filtered on the owner too, so only their partition of tasks is scanned
     query = (
-        select(Task)
+        select(Task, due_tasks.c.due_date)
+        .join(due_tasks, Task.id == due_tasks.c.task_id)
         .where(Task.owner_id == current_user.id)
-        .where(Task.due_date > now)
-        .where(~Task.completed)
     )
     if priority is not None:
         query = query.where(Task.priority == priority)
 
     total = await session.execute(select(func.count()).select_from(query.subquery()))
-    tasks = await session.scalars(
-        query.order_by(Task.due_date.asc().nulls_last())
+    rows = await session.execute(
+        query.order_by(due_tasks.c.due_date, Task.id)
         .offset(paging.offset)
         .limit(paging.limit)
     )
@@ -143,90 +382,425 @@ async def read_upcomming_tasks(
         page=paging.page,
         per_page=paging.per_page,
         total=total.scalar_one(),
-        results=tasks.all(),
+        results=[occurrence_public(task, due_date) for task, due_date in rows],
+    )
+
+
+def occurrence_public(task: Task, due_date: datetime) -> TaskPublic:
+    """Return a task due on `due_date`, which differs from its own due date for
+    later occurrences of a recurring task."""
+    return TaskPublic.model_validate(task).model_copy(update={"due_date": due_date})
+
+
+def in_subtree(task_id: int) -> ColumnElement[bool]:
+    """Match a task and all its subtasks, through the index on `path`."""
+    return (Task.id == task_id) | Task.path.contains([task_id])
+
+
+async def read_subtree(
+    session: AsyncSession, task_id: int, owner_id: int
+) -> TaskSubtree | None:
+    tasks = await session.scalars(
+        select(Task)
+        .where(Task.owner_id == owner_id)
+        .where(in_subtree(task_id))
+        # Sorts every task right after its parent, the root first
+        .order_by(func.array_append(Task.path, Task.id))
+        .execution_options(populate_existing=True)
+    )
+    subtree = tasks.all()
+    if not subtree:
+        return None
+
+    root, *descendants = subtree
+    return TaskSubtree(
+        **TaskPublic.model_validate(root).model_dump(),
+        descendants=descendants,
+        task_counts=TaskCounts(
+            open=sum(not task.completed for task in descendants),
+            total=len(descendants),
+        ),
+    )
+
+
+@router.get(
+    "/upcomming", response_model=Paged[TaskPublic], response_class=NegotiatedResponse
+)
+async def read_upcomming_tasks(
+    *,
+    session: ReadSessionDep,
+    current_user: CurrentUserDep,
+    paging: PaginationParamsDep,
+    priority: Annotated[int | None, Query(ge=1, le=5)] = None,
+) -> Paged[TaskPublic]:
+    return await read_due_tasks(
+        session,
+        current_user,
+        paging,
+        priority,
+        current_user.timezone,
+        start=func.now(),
     )
 
 
-@router.get("/today", response_model=Paged[TaskPublic])
+@router.get(
+    "/today", response_model=Paged[TaskPublic], response_class=NegotiatedResponse
+)
 async def read_due_today_tasks(
     *,
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: CurrentUserDep,
     paging: PaginationParamsDep,
     priority: Annotated[int | None, Query(ge=1, le=5)] = None,
-) -> Paged[Task]:
-    now = datetime.now(tz=UTC)
-    today_end = datetime.combine(now.date(), time.max, tzinfo=UTC)
-    today_start = datetime.combine(now.date(), time.min, tzinfo=UTC)
+    timezone: Annotated[TimeZone | None, Query()] = None,
+) -> Paged[TaskPublic]:
+    timezone = timezone or current_user.timezone
 
-    query = (
-        select(Task)
-        .where(Task.owner_id == current_user.id)
-        .where(Task.due_date.between(today_start, today_end))
-        .where(~Task.completed)
+    return await read_due_tasks(
+        session,
+        current_user,
+        paging,
+        priority,
+        timezone,
+        start=local_day_start(timezone),
+        end=local_day_start(timezone, days=1),
     )
-    if priority is not None:
-        query = query.where(Task.priority == priority)
 
-    total = await session.execute(select(func.count()).select_from(query.subquery()))
-    tasks = await session.scalars(query.offset(paging.offset).limit(paging.limit))
 
-    return Paged(
-        page=paging.page,
-        per_page=paging.per_page,
-        total=total.scalar_one(),
-        results=tasks.all(),
+@router.get(
+    "/calendar", response_model=Paged[TaskPublic], response_class=NegotiatedResponse
+)
+async def read_calendar_tasks(
+    *,
+    session: ReadSessionDep,
+    current_user: CurrentUserDep,
+    paging: PaginationParamsDep,
+    start: Annotated[datetime, Query()],
+    end: Annotated[datetime, Query()],
+    priority: Annotated[int | None, Query(ge=1, le=5)] = None,
+) -> Paged[TaskPublic]:
+    """Return the open tasks and occurrences of recurring tasks due in
+    [start, end), which can span up to a year."""
+    if not timedelta(0) < end - start <= timedelta(days=366):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Range must end after it starts and span at most 366 days",
+        )
+
+    return await read_due_tasks(
+        session,
+        current_user,
+        paging,
+        priority,
+        current_user.timezone,
+        start=literal(start, DateTime(timezone=True)),
+        end=literal(end, DateTime(timezone=True)),
     )
 
 
-@router.get("/overdue", response_model=Paged[TaskPublic])
+@router.get("/agenda", response_model=Agenda, response_class=NegotiatedResponse)
+async def read_agenda(
+    *,
+    session: ReadSessionDep,
+    current_user: CurrentUserDep,
+    per_bucket: Annotated[int, Query(ge=1, le=100)] = 10,
+    timezone: Annotated[TimeZone | None, Query()] = None,
+) -> Agenda:
+    """Return the open tasks due before today, today, tomorrow and in the rest
+    of the next seven days in the user's time zone, up to `per_bucket` tasks
+    each."""
+    timezone = timezone or current_user.timezone
+
+    due_tasks = select_due_tasks(
+        current_user.id, timezone, end=local_day_start(timezone, days=7)
+    )
+    due_date = due_tasks.c.due_date
+    bucket = case(
+        (due_date < local_day_start(timezone), "overdue"),
+        (due_date < local_day_start(timezone, days=1), "today"),
+        (due_date < local_day_start(timezone, days=2), "tomorrow"),
+        else_="this_week",
+    )
+    ranked = select(
+        due_tasks.c.task_id,
+        due_date,
+        bucket.label("bucket"),
+        func.row_number()
+        .over(partition_by=bucket, order_by=(due_date, due_tasks.c.task_id))
+        .label("rank"),
+        func.count().over(partition_by=bucket).label("total"),
+    ).subquery()
+    rows = await session.execute(
+        select(Task, ranked.c.due_date, ranked.c.bucket, ranked.c.total)
+        .join(ranked, Task.id == ranked.c.task_id)
+        .where(Task.owner_id == current_user.id)
+        .where(ranked.c.rank <= per_bucket)
+        .order_by(ranked.c.rank)
+    )
+
+    buckets = {
+        name: AgendaBucket(total=0, results=[])
+        for name in ("overdue", "today", "tomorrow", "this_week")
+    }
+    for task, due_date, name, total in rows:
+        buckets[name].total = total
+        buckets[name].results.append(occurrence_public(task, due_date))
+
+    return Agenda(timezone=timezone, **buckets)
+
+
+@router.get(
+    "/overdue", response_model=Paged[TaskPublic], response_class=NegotiatedResponse
+)
 async def read_overdue_tasks(
     *,
-    session: SessionDep,
+    session: ReadSessionDep,
     current_user: CurrentUserDep,
     paging: PaginationParamsDep,
     priority: Annotated[int | None, Query(ge=1, le=5)] = None,
-) -> Paged[Task]:
-    now = datetime.now(tz=UTC)
+) -> Paged[TaskPublic]:
+    return await read_due_tasks(
+        session,
+        current_user,
+        paging,
+        priority,
+        current_user.timezone,
+        end=func.now(),
+    )
 
-    query = (
+
+@router.get(
+    "/batch",
+    response_model=Batch[TaskPublicWithProjectLabels],
+    response_class=NegotiatedResponse,
+)
+async def read_tasks_batch(
+    *,
+    session: ReadSessionDep,
+    current_user: CurrentUserDep,
+    ids: Annotated[list[int], Query(min_length=1, max_length=100)],
+) -> Batch[Task]:
+    tasks = await session.scalars(
         select(Task)
+        .where(Task.id == any_(bindparam("ids", ids, type_=ARRAY(Integer))))
         .where(Task.owner_id == current_user.id)
-        .where(Task.due_date < now)
-        .where(~Task.completed)
+        .options(joinedload(Task.project), selectinload(Task.labels))
     )
-    if priority is not None:
-        query = query.where(Task.priority == priority)
+    results = tasks.all()
 
-    total = await session.execute(select(func.count()).select_from(query.subquery()))
-    tasks = await session.scalars(query.offset(paging.offset).limit(paging.limit))
+    found_ids = {task.id for task in results}
 
-    return Paged(
-        page=paging.page,
-        per_page=paging.per_page,
-        total=total.scalar_one(),
-        results=tasks.all(),
+    return Batch(
+        results=results,
+        missing=[id for id in dict.fromkeys(ids) if id not in found_ids],
     )
 
 
+def detail_options(
+    model: type[Task | ArchivedTask], fields: frozenset[str] | None
+) -> list[LoaderOption]:
+    """Load a task's details, only the requested fields if any."""
+    options: list[LoaderOption] = []
+    if not fields or "project" in fields:
+        options.append(joinedload(model.project))
+    if not fields or "labels" in fields:
+        options.append(selectinload(model.labels))
+    if fields:
+        options.append(load_columns(model, fields))
+    return options
+
+
 @router.get("/{task_id}", response_model=TaskPublicWithProjectLabels)
 async def read_task(
+    *,
+    session: ReadSessionDep,
+    current_user: CurrentUserDep,
+    task_id: int,
+    sparse: FieldsParamsDep,
+) -> Task | ArchivedTask | Response:
+    fields = requested_fields(sparse, TaskPublicWithProjectLabels)
+
+    task = await session.get(
+        Task, (task_id, current_user.id), options=detail_options(Task, fields)
+    ) or await session.get(
+        ArchivedTask,
+        (task_id, current_user.id),
+        options=detail_options(ArchivedTask, fields),
+    )
+    if not task or task.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+
+    if fields:
+        return sparse_response(
+            sparse_schema(TaskPublicWithProjectLabels, fields).model_validate(task)
+        )
+    return task
+
+
+@router.get("/{task_id}/subtree", response_model=TaskSubtree)
+async def read_task_subtree(
+    *,
+    session: ReadSessionDep,
+    current_user: CurrentUserDep,
+    task_id: int,
+) -> TaskSubtree:
+    """Return a task with all its subtasks, however deep, in one query."""
+    subtree = await read_subtree(session, task_id, current_user.id)
+    if subtree is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+
+    return subtree
+
+
+@router.post("/{task_id}/move", response_model=TaskPublic)
+async def move_task(
     *,
     session: SessionDep,
     current_user: CurrentUserDep,
     task_id: int,
+    move: TaskMove,
 ) -> Task:
-    task = await session.get(
-        Task, task_id, options=[joinedload(Task.project), selectinload(Task.labels)]
+    """Move a task with its subtasks under another task, or to the top level
+    without a parent."""
+    task = await get_task_for_update(session, task_id, current_user.id)
+    if not task or task.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+
+    path = []
+    if move.parent_id is not None:
+        parent = await session.get(
+            Task, (move.parent_id, current_user.id), with_for_update=True
+        )
+        if not parent or parent.owner_id != current_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Parent task not found",
+            )
+        if parent.id == task_id or task_id in parent.path:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot move a task under itself",
+            )
+        path = [*parent.path, parent.id]
+
+    # Swap the subtasks' ancestors above the task for the new ones
+    depth = len(task.path)
+    await session.execute(
+        update(Task)
+        .where(Task.owner_id == current_user.id)
+        .where(Task.path.contains([task_id]))
+        .values(
+            path=func.array_cat(
+                literal(path, ARRAY(Integer)),
+                Task.path[depth + 1 : func.cardinality(Task.path)],
+            )
+        )
     )
+    task.parent_id = move.parent_id
+    task.path = path
+
+    await publish(session, current_user.id, "task.updated", task_id)
+    await session.commit()
+
+    return task
+
+
+@router.post("/{task_id}/reorder", response_model=TaskPublic)
+async def reorder_task(
+    *,
+    session: SessionDep,
+    current_user: CurrentUserDep,
+    task_id: int,
+    reorder: TaskReorder,
+) -> Task:
+    """Place a task right after another task of its project, or first, by
+    changing its rank alone."""
+    task = await get_task_for_update(session, task_id, current_user.id)
     if not task or task.owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
         )
 
+    previous_rank = None
+    if reorder.after_id is not None:
+        previous = await session.get(Task, (reorder.after_id, current_user.id))
+        if (
+            not previous
+            or previous.owner_id != current_user.id
+            or previous.project_id != task.project_id
+            or previous.id == task_id
+        ):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Task to place after not found",
+            )
+        previous_rank = previous.rank
+
+    query = (
+        select(func.min(Task.rank))
+        .where(Task.owner_id == current_user.id)
+        .where(in_project(task.project_id))
+        .where(Task.id != task_id)
+    )
+    if previous_rank is not None:
+        query = query.where(Task.rank > previous_rank)
+    next_rank = await session.scalar(query)
+
+    in_place = (previous_rank is None or previous_rank < task.rank) and (
+        next_rank is None or task.rank < next_rank
+    )
+    if not in_place:
+        task.rank = rank_between(previous_rank, next_rank)
+
+    # Ranks grow when tasks keep being moved to the same spot
+    await respace_long_rank(session, current_user.id, task.project_id, task.rank)
+
+    await publish(session, current_user.id, "task.updated", task_id)
+    await session.commit()
+
     return task
 
 
+@router.post("/{task_id}/complete", response_model=TaskSubtree)
+async def complete_task_subtree(
+    *,
+    session: SessionDep,
+    current_user: CurrentUserDep,
+    task_id: int,
+) -> TaskSubtree:
+    """Complete a task with all its subtasks, in one statement."""
+    task = await get_task_for_update(session, task_id, current_user.id)
+    if not task or task.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+
+    await session.execute(
+        update(Task)
+        .where(Task.owner_id == current_user.id)
+        .where(in_subtree(task_id))
+        .where(~Task.completed)
+        .values(completed=True, completed_at=func.now())
+    )
+
+    await publish(session, current_user.id, "task.updated", task_id)
+    await session.commit()
+
+    subtree = await read_subtree(session, task_id, current_user.id)
+    if subtree is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+
+    return subtree
+
+
 @router.patch("/{task_id}", response_model=TaskPublicWithProject)
 async def update_task(
     *,
@@ -235,7 +809,7 @@ async def update_task(
     task_id: int,
     task: TaskUpdate,
 ) -> Task:
-    db_task = await session.get(Task, task_id)
+    db_task = await get_task_for_update(session, task_id, current_user.id)
     if not db_task or db_task.owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
@@ -249,10 +823,33 @@ async def update_task(
                 detail="Project not found",
             )
 
+    was_completed = db_task.completed
+    previous_project_id = db_task.project_id
     update_data = task.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_task, field, value)
+    if db_task.completed != was_completed:
+        db_task.completed_at = datetime.now(tz=UTC) if db_task.completed else None
+    if db_task.project_id != previous_project_id:
+        db_task.rank = rank_between(
+            await last_rank(session, current_user.id, db_task.project_id), None
+        )
+        await respace_long_rank(
+            session, current_user.id, db_task.project_id, db_task.rank
+        )
 
+    if db_task.recurrence is not None and db_task.due_date is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Recurring tasks must have a due date",
+        )
+    if update_data.keys() & {"due_date", "recurrence"}:
+        # Completed and skipped occurrences belong to the previous schedule
+        await session.execute(
+            delete(TaskOccurrence).where(TaskOccurrence.task_id == task_id)
+        )
+
+    await publish(session, current_user.id, "task.updated", task_id)
     await session.commit()
     await session.refresh(db_task, attribute_names={"project"})
 
@@ -267,7 +864,9 @@ async def assign_label_to_task(
     task_id: int,
     label_id: int,
 ) -> Task:
-    task = await session.get(Task, task_id, options=[selectinload(Task.labels)])
+    task = await get_task_for_update(
+        session, task_id, current_user.id, options=[selectinload(Task.labels)]
+    )
     if not task or task.owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
@@ -286,6 +885,7 @@ async def assign_label_to_task(
 
     task.labels.append(label)
 
+    await publish(session, current_user.id, "task.updated", task_id)
     await session.commit()
     await session.refresh(task, attribute_names={"labels"})
 
@@ -300,7 +900,9 @@ async def remove_label_from_task(
     task_id: int,
     label_id: int,
 ) -> Task:
-    task = await session.get(Task, task_id, options=[selectinload(Task.labels)])
+    task = await get_task_for_update(
+        session, task_id, current_user.id, options=[selectinload(Task.labels)]
+    )
     if not task or task.owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
@@ -314,24 +916,134 @@ async def remove_label_from_task(
 
     task.labels.remove(label)
 
+    await publish(session, current_user.id, "task.updated", task_id)
     await session.commit()
     await session.refresh(task, attribute_names={"labels"})
 
     return task
 
 
-@router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_task(
+@router.put("/{task_id}/occurrences", response_model=TaskOccurrencePublic)
+async def update_task_occurrence(
+    *,
+    session: SessionDep,
+    current_user: CurrentUserDep,
+    task_id: int,
+    occurrence: TaskOccurrenceUpdate,
+) -> TaskOccurrence:
+    """Complete or skip an occurrence of a recurring task."""
+    task = await session.get(Task, (task_id, current_user.id))
+    if not task or task.owner_id != current_user.id:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+        )
+    if task.recurrence is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Task is not recurring"
+        )
+
+    due_date = literal(occurrence.due_date, DateTime(timezone=True))
+    occurrences = select_occurrences(
+        current_user.id,
+        current_user.timezone,
+        due_date,
+        due_date + timedelta(microseconds=1),
+        open_only=False,
+    ).subquery()
+    if not await session.scalar(
+        select(occurrences.c.task_id)
+        .where(occurrences.c.task_id == task_id)
+        .exists()
+        .select()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Occurrence not found"
+        )
+
+    db_occurrence = (
+        await session.execute(
+            insert(TaskOccurrence)
+            .values(
+                task_id=task_id, owner_id=current_user.id, **occurrence.model_dump()
+            )
+            .on_conflict_do_update(
+                index_elements=[TaskOccurrence.task_id, TaskOccurrence.due_date],
+                set_={"status": occurrence.status},
+            )
+            .returning(TaskOccurrence)
+        )
+    ).scalar_one()
+
+    await publish(session, current_user.id, "task.updated", task_id)
+    await session.commit()
+
+    return db_occurrence
+
+
+@router.delete("/{task_id}/occurrences", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_task_occurrence(
     *,
     session: SessionDep,
     current_user: CurrentUserDep,
     task_id: int,
+    due_date: Annotated[datetime, Query()],
 ) -> None:
-    task = await session.get(Task, task_id)
+    """Reopen a completed or skipped occurrence of a recurring task."""
+    task = await session.get(Task, (task_id, current_user.id))
     if not task or task.owner_id != current_user.id:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
         )
 
-    await session.delete(task)
+    result = cast(
+        CursorResult,
+        await session.execute(
+            delete(TaskOccurrence)
+            .where(TaskOccurrence.task_id == task_id)
+            .where(TaskOccurrence.due_date == due_date)
+        ),
+    )
+    if not result.rowcount:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Occurrence not found"
+        )
+
+    await publish(session, current_user.id, "task.updated", task_id)
+    await session.commit()
+
+
+@router.delete("/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_task(
+    *,
+    session: SessionDep,
+    current_user: CurrentUserDep,
+    task_id: int,
+) -> None:
+    task = await session.get(Task, (task_id, current_user.id))
+    if not task:
+        result = cast(
+            CursorResult,
+            await session.execute(
+                update(ArchivedTask)
+                .where(ArchivedTask.id == task_id)
+                .where(ArchivedTask.owner_id == current_user.id)
+                .values({ArchivedTask.deleted_at: func.now()})
+            ),
+        )
+        if not result.rowcount:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="Task not found"
+            )
+    else:
+        # Hidden from now on, with its subtasks, and purged with their labels
+        # in the background
+        task.deleted_at = datetime.now(tz=UTC)
+        await session.execute(
+            update(Task)
+            .where(Task.owner_id == current_user.id)
+            .where(Task.path.contains([task_id]))
+            .values({Task.deleted_at: func.now()})
+        )
+
+    await publish(session, current_user.id, "task.deleted", task_id)
     await session.commit()
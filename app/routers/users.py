@@ -3,7 +3,7 @@ from sqlalchemy import select
 
 from app.core.security import hash_password
 from app.deps import CurrentUserDep, SessionDep
-from app.models import UserCreate, UserPublic
+from app.models import UserCreate, UserPublic, UserUpdate
 from app.schema import User
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -50,3 +50,20 @@ async def create_user(
 @router.get("/me", response_model=UserPublic)
 async def read_users_me(*, current_user: CurrentUserDep) -> User:
     return current_user
+
+
+@router.patch("/me", response_model=UserPublic)
+async def update_users_me(
+    *,
+    session: SessionDep,
+    current_user: CurrentUserDep,
+    user: UserUpdate,
+) -> User:
+    update_data = user.model_dump(exclude_unset=True, exclude_none=True)
+    for field, value in update_data.items():
+        setattr(current_user, field, value)
+
+    await session.commit()
+    await session.refresh(current_user)
+
+    return current_user
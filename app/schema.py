@@ -6,13 +6,19 @@ from sqlalchemy import (
     CheckConstraint,
     DateTime,
     ForeignKey,
+    ForeignKeyConstraint,
+    Index,
+    Integer,
+    LargeBinary,
     String,
     UniqueConstraint,
     func,
+    text,
 )
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from app.core.db import Base
+from app.core.db import Base, SoftDeleteMixin
 
 
 class User(Base):
@@ -22,6 +28,7 @@ class User(Base):
     username: Mapped[str] = mapped_column(unique=True, index=True)
     email: Mapped[str] = mapped_column(unique=True, index=True)
     hashed_password: Mapped[str]
+    timezone: Mapped[str] = mapped_column(String(length=64), server_default="UTC")
 
     projects: Mapped[list[Project]] = relationship(
         back_populates="owner", cascade="all, delete-orphan"
@@ -34,8 +41,20 @@ class User(Base):
     )
 
 
-class Project(Base):
+class Project(SoftDeleteMixin, Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        Index(
+            "ix_projects_owner_id",
+            "owner_id",
+            postgresql_where="deleted_at IS NULL",
+        ),
+        Index(
+            "ix_projects_deleted_at",
+            "deleted_at",
+            postgresql_where="deleted_at IS NOT NULL",
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(length=255), index=True)
@@ -47,41 +66,105 @@ class Project(Base):
 
     owner: Mapped[User] = relationship(back_populates="projects")
     tasks: Mapped[list[Task]] = relationship(
-        back_populates="project", cascade="all, delete-orphan"
+        back_populates="project", cascade="all, delete-orphan", passive_deletes=True
     )
 
 
 class TaskLabel(Base):
     __tablename__ = "task_labels"
-
-    task_id: Mapped[int] = mapped_column(
-        ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["task_id", "owner_id"],
+            ["tasks.id", "tasks.owner_id"],
+            ondelete="CASCADE",
+        ),
+        {"postgresql_partition_by": "HASH (owner_id)"},
     )
+
+    task_id: Mapped[int] = mapped_column(primary_key=True)
     label_id: Mapped[int] = mapped_column(
-        ForeignKey("labels.id", ondelete="CASCADE"), primary_key=True
+        ForeignKey("labels.id", ondelete="CASCADE"), primary_key=True, index=True
     )
+    owner_id: Mapped[int] = mapped_column(primary_key=True)
+
 
+class Task(SoftDeleteMixin, Base):
+    """A task, in a table hash partitioned by owner.
+
+    The owner is part of the primary key, so loading a task by its key only
+    scans the owner's partition.
+
+    Subtasks keep the ids of their ancestors, from the root down, in `path`,
+    so a subtree is read with one indexed `path @> ARRAY[id]` query.
+    """
 
-class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index(
+            "ix_tasks_due_date",
+            "due_date",
+            postgresql_where="deleted_at IS NULL",
+        ),
+        # Archival candidates, a small slice of the table as they are moved out
+        Index(
+            "ix_tasks_completed_at",
+            "completed_at",
+            postgresql_where="completed AND deleted_at IS NULL",
+        ),
+        # Purge candidates
+        Index(
+            "ix_tasks_deleted_at",
+            "deleted_at",
+            postgresql_where="deleted_at IS NOT NULL",
+        ),
+        ForeignKeyConstraint(
+            ["parent_id", "owner_id"],
+            ["tasks.id", "tasks.owner_id"],
+            ondelete="CASCADE",
+        ),
+        Index(
+            "ix_tasks_parent_id",
+            "parent_id",
+            postgresql_where="parent_id IS NOT NULL",
+        ),
+        Index("ix_tasks_path", "path", postgresql_using="gin"),
+        Index("ix_tasks_project_id_rank", "project_id", "rank"),
+        {"postgresql_partition_by": "HASH (owner_id)"},
+    )
     __table_args = (
         CheckConstraint("priority >= 1 AND priority <= 5", name="check_priority_range"),
     )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column(String(length=255), index=True)
     description: Mapped[str | None] = mapped_column(String(length=500), default=None)
     priority: Mapped[int] = mapped_column(default=1)
     completed: Mapped[bool] = mapped_column(default=False)
+    completed_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), default=None
+    )
     due_date: Mapped[datetime | None] = mapped_column(
-        DateTime(timezone=True), default=None, index=True
+        DateTime(timezone=True), default=None
     )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now()
     )
-    owner_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
     project_id: Mapped[int | None] = mapped_column(
-        ForeignKey("projects.id", ondelete="CASCADE")
+        ForeignKey("projects.id", ondelete="CASCADE"), index=True
+    )
+    # Recurrence rule, repeating the task from its due date
+    recurrence: Mapped[dict | None] = mapped_column(JSONB, default=None)
+    parent_id: Mapped[int | None] = mapped_column(default=None)
+    path: Mapped[list[int]] = mapped_column(
+        ARRAY(Integer), default=list, server_default=text("'{}'")
+    )
+    # Manual order within the project, see app.core.ranking. Compared byte by
+    # byte, whatever the database's collation.
+    rank: Mapped[str] = mapped_column(
+        String(length=255, collation="C"), server_default="V"
     )
 
     owner: Mapped[User] = relationship(back_populates="tasks")
@@ -91,6 +174,97 @@ class Task(Base):
     )
 
 
+class TaskOccurrence(Base):
+    """An occurrence of a recurring task that was completed or skipped.
+
+    Open occurrences are not stored, they are expanded from the rule.
+    """
+
+    __tablename__ = "task_occurrences"
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('completed', 'skipped')", name="check_occurrence_status"
+        ),
+        ForeignKeyConstraint(
+            ["task_id", "owner_id"],
+            ["tasks.id", "tasks.owner_id"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    task_id: Mapped[int] = mapped_column(primary_key=True)
+    due_date: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True
+    )
+    owner_id: Mapped[int]
+    status: Mapped[str] = mapped_column(String(length=9))
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+
+class ArchivedTaskLabel(Base):
+    __tablename__ = "archived_task_labels"
+    __table_args__ = (
+        ForeignKeyConstraint(
+            ["task_id", "owner_id"],
+            ["archived_tasks.id", "archived_tasks.owner_id"],
+            ondelete="CASCADE",
+        ),
+    )
+
+    task_id: Mapped[int] = mapped_column(primary_key=True)
+    label_id: Mapped[int] = mapped_column(
+        ForeignKey("labels.id", ondelete="CASCADE"), primary_key=True
+    )
+    owner_id: Mapped[int] = mapped_column(primary_key=True)
+
+
+class ArchivedTask(SoftDeleteMixin, Base):
+    """A completed task moved out of `tasks` by the archiver, so the hot
+    table and its indexes only hold active work.
+
+    The columns match `tasks`, so rows move between the tables as they are.
+    """
+
+    __tablename__ = "archived_tasks"
+    __table_args__ = (
+        Index("ix_archived_tasks_owner_id_id", "owner_id", "id"),
+        Index(
+            "ix_archived_tasks_deleted_at",
+            "deleted_at",
+            postgresql_where="deleted_at IS NOT NULL",
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    title: Mapped[str] = mapped_column(String(length=255))
+    description: Mapped[str | None] = mapped_column(String(length=500))
+    priority: Mapped[int]
+    completed: Mapped[bool]
+    completed_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    due_date: Mapped[datetime | None] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    project_id: Mapped[int | None] = mapped_column(
+        ForeignKey("projects.id", ondelete="CASCADE"), index=True
+    )
+    recurrence: Mapped[dict | None] = mapped_column(JSONB)
+    parent_id: Mapped[int | None]
+    path: Mapped[list[int]] = mapped_column(ARRAY(Integer))
+    rank: Mapped[str] = mapped_column(String(length=255, collation="C"))
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+
+    project: Mapped[Project | None] = relationship()
+    labels: Mapped[list[Label]] = relationship(
+        secondary="archived_task_labels", viewonly=True
+    )
+
+
 class Label(Base):
     __tablename__ = "labels"
     __table_args__ = (UniqueConstraint("name", "owner_id", name="uq_label_name_owner"),)
@@ -104,3 +278,75 @@ class Label(Base):
     tasks: Mapped[list[Task]] = relationship(
         secondary="task_labels", back_populates="labels", passive_deletes=True
     )
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    subject: Mapped[str] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column(String(length=255), primary_key=True)
+    request_hash: Mapped[str] = mapped_column(String(length=64))
+    status_code: Mapped[int | None] = mapped_column(default=None)
+    content_type: Mapped[str | None] = mapped_column(default=None)
+    response_body: Mapped[bytes | None] = mapped_column(LargeBinary, default=None)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), index=True
+    )
+
+
+class Job(Base):
+    """A background job, claimed by one worker at a time.
+
+    A running job's lease is extended while it reports progress. Once it
+    expires, the job is claimed again, as its worker is presumed dead.
+    """
+
+    __tablename__ = "jobs"
+    __table_args__ = (
+        CheckConstraint(
+            "status IN ('queued', 'running', 'succeeded', 'failed')",
+            name="check_job_status",
+        ),
+        # Claimable jobs, the finished ones are only read by id
+        Index(
+            "ix_jobs_run_at",
+            "run_at",
+            postgresql_where="status IN ('queued', 'running')",
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), index=True
+    )
+    kind: Mapped[str] = mapped_column(String(length=50))
+    payload: Mapped[dict] = mapped_column(JSONB)
+    status: Mapped[str] = mapped_column(String(length=9), default="queued")
+    progress: Mapped[float] = mapped_column(default=0)
+    attempts: Mapped[int] = mapped_column(default=0)
+    max_attempts: Mapped[int]
+    result: Mapped[dict | None] = mapped_column(JSONB, default=None)
+    error: Mapped[str | None] = mapped_column(String(length=500), default=None)
+    run_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    locked_until: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), default=None
+    )
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    finished_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), default=None
+    )
+
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+    __table_args__ = ({"prefixes": ["UNLOGGED"]},)
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    tokens: Mapped[float]
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
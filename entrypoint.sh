@@ -1,5 +1,8 @@
 #!/bin/sh
+set -e
 
-uv run alembic upgrade head
+# The image is synced at build time, skip uv's environment check on boot
+uv run --no-sync python -m scripts.migrate
 
-uv run uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers 4
+# Workers are sized from the machine, see scripts/serve.py
+exec uv run --no-sync python -m scripts.serve --host 0.0.0.0 --port 8000
@@ -0,0 +1,123 @@
+"""Measure the throughput and latency of a running server under a fixed
+number of concurrent clients, and the size of its responses on the wire.
+
+Pass --encoding several times to compare response encodings, like
+`--encoding identity --encoding gzip --encoding br --encoding zstd`, and
+--server-pid to also report the server's CPU time per response. Add
+`--header "Accept: application/msgpack"` to measure MessagePack instead of
+JSON.
+
+Usage:
+    uv run python scripts/benchmark.py [--url URL] [--concurrency N] \
+        [--duration SECONDS] [--header "Authorization: Bearer ..."] \
+        [--encoding ENCODING] [--server-pid PID]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from pathlib import Path
+
+import httpx
+
+
+def process_cpu_seconds(pid: int) -> float:
+    """Return the CPU time used by a process so far, from /proc on Linux."""
+    fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    # utime and stime, the 14th and 15th fields counting the pid and name
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+async def run_client(
+    client: httpx.AsyncClient,
+    url: str,
+    deadline: float,
+    latencies: list[float],
+    sizes: list[int],
+) -> int:
+    errors = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        # Read as sent, without decompressing
+        async with client.stream("GET", url) as response:
+            size = 0
+            async for chunk in response.aiter_raw():
+                size += len(chunk)
+        if response.is_success:
+            latencies.append(time.perf_counter() - start)
+            sizes.append(size)
+        else:
+            errors += 1
+    return errors
+
+
+async def benchmark(
+    url: str,
+    concurrency: int,
+    duration: float,
+    headers: dict[str, str],
+    server_pid: int | None,
+) -> None:
+    latencies: list[float] = []
+    sizes: list[int] = []
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(headers=headers, limits=limits) as client:
+        # Open the connections before measuring
+        await asyncio.gather(*(client.get(url) for _ in range(concurrency)))
+
+        cpu_start = process_cpu_seconds(server_pid) if server_pid else 0
+        deadline = time.perf_counter() + duration
+        errors = await asyncio.gather(
+            *(
+                run_client(client, url, deadline, latencies, sizes)
+                for _ in range(concurrency)
+            )
+        )
+        cpu = process_cpu_seconds(server_pid) - cpu_start if server_pid else 0
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    report = (
+        f"{len(latencies) / duration:.0f} req/s, "
+        f"p50 {quantiles[49] * 1000:.1f} ms, p99 {quantiles[98] * 1000:.1f} ms, "
+        f"{statistics.mean(sizes):.0f} B/response, "
+        f"{sum(errors)} errors"
+    )
+    if server_pid:
+        report += f", {cpu / len(latencies) * 1000:.2f} ms CPU/response"
+    print(report)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/health/live")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--header", action="append", default=[])
+    parser.add_argument("--encoding", action="append", default=[])
+    parser.add_argument("--server-pid", type=int)
+    args = parser.parse_args()
+
+    headers = dict(header.split(": ", 1) for header in args.header)
+    if not args.encoding:
+        asyncio.run(
+            benchmark(
+                args.url, args.concurrency, args.duration, headers, args.server_pid
+            )
+        )
+    for encoding in args.encoding:
+        print(f"{encoding}: ", end="", flush=True)
+        asyncio.run(
+            benchmark(
+                args.url,
+                args.concurrency,
+                args.duration,
+                {**headers, "Accept-Encoding": encoding},
+                args.server_pid,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
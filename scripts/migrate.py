@@ -0,0 +1,51 @@
+"""Upgrade the database to the latest revision, unless it is already there.
+
+Checking the revision is a single query and skips loading the migration
+environment and the app's models, which keeps every boot after the first one
+of a deploy fast.
+
+Usage:
+    uv run python -m scripts.migrate
+"""
+
+import asyncio
+
+import asyncpg
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+from alembic import command
+from app.core.config import config as app_config
+
+
+async def get_current_revisions() -> set[str]:
+    connection = await asyncpg.connect(
+        host=app_config.pghost,
+        user=app_config.pguser,
+        password=app_config.pgpassword,
+        database=app_config.pgdatabase,
+        ssl=True,
+    )
+    try:
+        rows = await connection.fetch("SELECT version_num FROM alembic_version")
+    except asyncpg.UndefinedTableError:
+        return set()
+    finally:
+        await connection.close()
+
+    return {row["version_num"] for row in rows}
+
+
+def main() -> None:
+    config = Config("alembic.ini")
+    heads = set(ScriptDirectory.from_config(config).get_heads())
+
+    if asyncio.run(get_current_revisions()) == heads:
+        print("Database is up to date, skipping migrations")
+        return
+
+    command.upgrade(config, "head")
+
+
+if __name__ == "__main__":
+    main()
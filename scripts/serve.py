@@ -0,0 +1,71 @@
+"""Serve the app with uvloop and httptools, with one worker process per CPU
+the machine can run and hold in memory.
+
+Set WEB_CONCURRENCY to force the number of workers. It is passed on to the
+workers, which split DB_MAX_CONNECTIONS between them.
+
+Usage:
+    uv run python -m scripts.serve [--host HOST] [--port PORT]
+"""
+
+import argparse
+import math
+import os
+from pathlib import Path
+
+import uvicorn
+
+from app.core.config import config
+
+
+def get_cpu_limit() -> int:
+    cpus = os.process_cpu_count() or 1
+
+    # A container may be given less CPU time than it sees CPUs
+    cpu_max = Path("/sys/fs/cgroup/cpu.max")
+    if cpu_max.exists():
+        quota, period = cpu_max.read_text().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+
+    return cpus
+
+
+def get_memory_limit_mb() -> int:
+    memory_max = Path("/sys/fs/cgroup/memory.max")
+    if memory_max.exists() and (limit := memory_max.read_text().strip()) != "max":
+        return int(limit) // 2**20
+
+    return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 2**20
+
+
+def get_workers() -> int:
+    # Workers are async, more of them than CPUs only adds memory and
+    # connections
+    by_memory = get_memory_limit_mb() // config.worker_memory_mb
+    return max(1, min(get_cpu_limit(), by_memory))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    workers = config.web_concurrency or get_workers()
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        # Drain in-flight requests for up to the request timeout on SIGTERM
+        timeout_graceful_shutdown=30,
+    )
+
+
+if __name__ == "__main__":
+    main()
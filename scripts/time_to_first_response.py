@@ -0,0 +1,58 @@
+"""Measure the time from launching a server command until it answers its
+first request.
+
+Usage:
+    uv run python scripts/time_to_first_response.py [--url URL] [--runs N] \
+        -- uvicorn app.main:app --port 8000
+"""
+
+import argparse
+import statistics
+import subprocess
+import time
+
+import httpx
+
+
+def time_to_first_response(command: list[str], url: str, timeout: float) -> float:
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                response = httpx.get(url, timeout=1)
+            except httpx.TransportError:
+                time.sleep(0.01)
+                continue
+            if response.is_success:
+                return time.perf_counter() - start
+        raise TimeoutError(f"{url} did not answer within {timeout}s")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://127.0.0.1:8000/health/live")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("command", nargs="+")
+    args = parser.parse_args()
+
+    timings = [
+        time_to_first_response(args.command, args.url, args.timeout)
+        for _ in range(args.runs)
+    ]
+
+    print(
+        f"time to first response: median {statistics.median(timings) * 1000:.0f} ms, "
+        f"min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms "
+        f"over {args.runs} runs"
+    )
+
+
+if __name__ == "__main__":
+    main()
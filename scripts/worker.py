@@ -0,0 +1,56 @@
+"""Run background jobs beside the web workers, with JOB_WORKERS=0 set for
+them so they leave the queue to this process.
+
+Every job holds a connection and reports its progress on another, so the
+process needs two connections per job it runs. Its pool is sized like a web
+worker's, so give it its own share of connections with DB_MAX_CONNECTIONS,
+and leave that share out of the web workers' DB_MAX_CONNECTIONS.
+
+Usage:
+    uv run python -m scripts.worker [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import signal
+
+from app import jobs as job_handlers  # noqa: F401, registers the job handlers
+from app.core.config import config
+from app.core.db import dispose_engines
+from app.core.jobs import JobWorker
+
+
+async def run(concurrency: int) -> None:
+    worker = asyncio.create_task(JobWorker(concurrency).run())
+    # Interrupted jobs are put back in the queue on the way out
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, worker.cancel)
+    try:
+        with contextlib.suppress(asyncio.CancelledError):
+            await worker
+    finally:
+        await dispose_engines()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--concurrency", type=int, default=4, help="jobs run at the same time"
+    )
+    args = parser.parse_args()
+
+    pool_size, max_overflow = config.db_pool_limits
+    if pool_size + max_overflow < 2 * args.concurrency:
+        parser.error(
+            f"{args.concurrency} jobs need {2 * args.concurrency} connections, "
+            f"the pool holds {pool_size + max_overflow}, raise DB_MAX_CONNECTIONS"
+        )
+
+    logging.basicConfig(level=logging.INFO)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(run(args.concurrency))
+
+
+if __name__ == "__main__":
+    main()